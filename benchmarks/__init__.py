@@ -0,0 +1,5 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for speedparser.  These are not installed with the package;
+run them from a checkout, eg. `python -m benchmarks.feedparserdict`."""
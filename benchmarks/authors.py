@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks munge_author against the regex search it used to do, on the
+author strings feeds usually have and on adversarial ones:  long runs of
+email-like garbage around '@'s, which made the search backtrack for seconds.
+Before timing, both are checked to give identical output on every input and
+on a batch of random strings built from email characters.
+
+Run with `python -m benchmarks.authors [--fuzz N]`."""
+
+import re
+import sys
+import random
+import argparse
+
+from speedparser.speedparser import munge_author
+from benchmarks.runner import best
+
+search_re = re.compile(r"(([a-zA-Z0-9\_\-\.\+]+)@((\[[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.)|(([a-zA-Z0-9\-]+\.)+))([a-zA-Z]{2,4}|[0-9]{1,3})(\]?))(\?subject=\S+)?", re.UNICODE)
+
+
+def munge_author_search(author):
+    """munge_author as it was, searching for the whole email pattern."""
+    if '@' in author:
+        emailmatch = search_re.search(author)
+        if emailmatch:
+            email = emailmatch.group(0)
+            author = author.replace(email, u'')
+            author = author.replace(u'()', u'')
+            author = author.replace(u'<>', u'')
+            author = author.replace(u'&lt;&gt;', u'')
+            author = author.strip()
+            if author and (author[0] == u'('):
+                author = author[1:]
+            if author and (author[-1] == u')'):
+                author = author[:-1]
+            author = author.strip()
+            return '%s (%s)' % (author, email)
+    return author
+
+typical = [
+    u'Jane Doe',
+    u'jane@example.com (Jane Doe)',
+    u'Jane Doe <jane.doe+feeds@mail.example.co.uk>',
+    u'jane@example.com',
+    u'noreply@blogger.com (Jane)',
+    u'Jane Doe &lt;jane@example.com&gt;',
+    u'mailto:jane@[192.168.0.1]',
+    u'jane@example.com?subject=Hello',
+]
+
+
+def adversarial(size):
+    return [
+        (u'a' * size) + u'@',
+        (u'a' * size) + u'@' + (u'b' * size),
+        u'@'.join([u'a.b-c'] * (size // 5)),
+        u'x@' + (u'a.' * (size // 2)) + u'!',
+        (u'a@' * (size // 2)) + u'-',
+        u'Jane ' + (u'.' * size) + u'@' + (u'-.' * (size // 2)),
+    ]
+
+
+def fuzz(count, seed=0, alphabet=u'ab1.-_+@[]?= ()<>'):
+    rand = random.Random(seed)
+    return [u''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 40)))
+        for _ in range(count)]
+
+
+def check(inputs):
+    for author in inputs:
+        expected, got = munge_author_search(author), munge_author(author)
+        if expected != got:
+            raise AssertionError("munge_author(%r) is %r, not %r" % (author, got, expected))
+
+
+def best_time(func, inputs):
+    """Best of 3 runs over inputs, or None if a run takes over 2 seconds."""
+    def run():
+        for author in inputs:
+            func(author)
+    return best(run, budget=2.0)
+
+
+def fmt(seconds):
+    return '%10.3f ms' % (seconds * 1000) if seconds is not None else '%13s' % 'too slow'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark munge_author.")
+    parser.add_argument('--fuzz', type=int, default=20000, help="random inputs to check")
+    args = parser.parse_args(argv)
+    cases = [('typical x1000', typical * 1000)]
+    for size in (100, 1000, 5000):
+        cases.append(('adversarial %d' % size, adversarial(size)))
+    check(fuzz(args.fuzz))
+    for name, inputs in cases:
+        if not name.endswith('5000'):
+            check(inputs)
+    sys.stdout.write("%-20s %13s %13s\n" % ('inputs', 'search', 'munge_author'))
+    for name, inputs in cases:
+        sys.stdout.write("%-20s %s %s\n" % (name, fmt(best_time(munge_author_search, inputs)),
+            fmt(best_time(munge_author, inputs))))
+
+if __name__ == '__main__':
+    main()
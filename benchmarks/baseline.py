@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A performance regression gate.  `record` runs the corpus scenarios and
+writes every timing sample to a JSON baseline;  `compare` runs the same
+scenarios again and compares each scenario's metrics against the baseline,
+exiting non-zero if any of them regressed.
+
+The metrics, all in seconds per feed, are:
+
+ * end_to_end:  a whole parse with html cleaning, timed without stats
+ * parse:  lxml parsing (ParseStats' parse_xml)
+ * clean:  html cleaning
+ * date:  date parsing
+
+A metric regresses when its median grows by more than `threshold` median
+absolute deviations (the larger of the baseline's and the new run's, so a
+noisy metric needs a larger change) and by more than `min_change` relative
+to the baseline, which keeps very stable metrics from failing on tiny
+changes.
+
+    python -m benchmarks.baseline record baseline.json
+    python -m benchmarks.baseline compare baseline.json --threshold 3
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+
+import speedparser
+from benchmarks import corpus
+from benchmarks.runner import clock, median
+
+FORMAT_VERSION = 1
+
+metrics = ('end_to_end', 'parse', 'clean', 'date')
+phase_metrics = {'parse': 'parse_xml', 'clean': 'clean', 'date': 'date'}
+
+
+def mad(samples):
+    """Median absolute deviation."""
+    m = median(samples)
+    return median([abs(s - m) for s in samples])
+
+
+def measure(documents, repeat=5, warmup=1):
+    """Return {metric: [seconds per feed, one per pass]} for the documents."""
+    n = float(len(documents))
+    for i in range(warmup):
+        for doc in documents:
+            speedparser.parse(doc)
+    samples = dict((m, []) for m in metrics)
+    for i in range(repeat):
+        t0 = clock()
+        for doc in documents:
+            speedparser.parse(doc)
+        samples['end_to_end'].append((clock() - t0) / n)
+    for i in range(repeat):
+        stats = speedparser.ParseStats()
+        for doc in documents:
+            speedparser.parse(doc, stats=stats)
+        for metric, phase in phase_metrics.items():
+            samples[metric].append(stats.timings.get(phase, 0.0) / n)
+    return samples
+
+
+def run(names=None, count=10, repeat=5, warmup=1, seed=0):
+    """Run the scenarios and return a baseline dict."""
+    scenarios = {}
+    for scenario, documents in corpus.build(count, seed, names):
+        samples = measure(documents, repeat, warmup)
+        scenarios[scenario.name] = dict((metric, {
+            'median': median(values), 'mad': mad(values), 'samples': values,
+        }) for metric, values in samples.items())
+    return {
+        'format': FORMAT_VERSION,
+        'speedparser': '.'.join(map(str, speedparser.VERSION)),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'settings': {'scenarios': sorted(scenarios), 'feeds': count,
+            'repeat': repeat, 'warmup': warmup, 'seed': seed},
+        'scenarios': scenarios,
+    }
+
+
+def load(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('format') != FORMAT_VERSION:
+        raise ValueError("%s is a format %r baseline;  expected format %d" % (
+            path, baseline.get('format'), FORMAT_VERSION))
+    return baseline
+
+
+def save(baseline, path):
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def compare(baseline, current, threshold=3.0, min_change=0.05):
+    """Compare two baselines;  returns a list of rows (scenario, metric,
+    baseline median, current median, relative change, status), where status
+    is 'regression', 'improvement', 'ok' or 'missing'."""
+    rows = []
+    for name in sorted(baseline['scenarios']):
+        for metric in metrics:
+            base = baseline['scenarios'][name].get(metric)
+            cur = current['scenarios'].get(name, {}).get(metric)
+            if base is None or cur is None:
+                rows.append((name, metric, base and base['median'], None, None, 'missing'))
+                continue
+            b, c = base['median'], cur['median']
+            if not b:
+                rows.append((name, metric, b, c, None, 'ok'))
+                continue
+            change = (c - b) / b
+            noise = threshold * max(base['mad'], cur['mad'])
+            status = 'ok'
+            if abs(c - b) > noise and abs(change) > min_change:
+                status = 'regression' if change > 0 else 'improvement'
+            rows.append((name, metric, b, c, change, status))
+    return rows
+
+
+def report(rows, out=sys.stdout):
+    out.write("%-18s %-11s %12s %12s %9s  %s\n" % (
+        'scenario', 'metric', 'baseline us', 'current us', 'change', 'status'))
+    for name, metric, b, c, change, status in rows:
+        fmt = lambda v: '%12.1f' % (v * 1e6) if v is not None else '%12s' % '-'
+        pct = '%+8.1f%%' % (change * 100) if change is not None else '%9s' % '-'
+        out.write("%-18s %-11s %s %s %s  %s\n" % (name, metric, fmt(b), fmt(c), pct, status))
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Record or check a performance baseline.")
+    sub = parser.add_subparsers(dest='command')
+    record = sub.add_parser('record', help="write a new baseline")
+    record.add_argument('path')
+    record.add_argument('-s', '--scenario', action='append', dest='scenarios',
+        choices=sorted(corpus.scenario_map), help="scenario to run (default: all)")
+    record.add_argument('-n', '--feeds', type=int, default=10, help="feeds per scenario")
+    record.add_argument('-r', '--repeat', type=int, default=7, help="timed passes")
+    record.add_argument('-w', '--warmup', type=int, default=1, help="untimed warmup passes")
+    record.add_argument('--seed', type=int, default=0, help="corpus seed")
+    check = sub.add_parser('compare', help="compare a new run against a baseline")
+    check.add_argument('path')
+    check.add_argument('-t', '--threshold', type=float, default=3.0,
+        help="MADs a median must move by to count as a change")
+    check.add_argument('-c', '--min-change', type=float, default=0.05,
+        help="relative change a median must also exceed")
+    check.add_argument('--save', help="also write the new run to this path")
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    if args.command == 'record':
+        baseline = run(args.scenarios, args.feeds, args.repeat, args.warmup, args.seed)
+        save(baseline, args.path)
+        return 0
+    baseline = load(args.path)
+    s = baseline['settings']
+    current = run(s['scenarios'], s['feeds'], s['repeat'], s['warmup'], s['seed'])
+    if args.save:
+        save(current, args.save)
+    rows = compare(baseline, current, args.threshold, args.min_change)
+    report(rows)
+    regressions = [r for r in rows if r[-1] == 'regression']
+    if regressions:
+        sys.stdout.write("%d regression(s)\n" % len(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A deterministic generator of synthetic feeds for benchmarking.  Feeds are
+RSS 2.0, RDF (RSS 1.0) or Atom documents whose entry count, body size,
+namespace extensions, date format and encoding are chosen by a scenario;
+the same seed always produces the same bytes, so timings from different
+machines and revisions are comparable."""
+
+import random
+from xml.sax.saxutils import escape
+
+words = (u'lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+    u'eiusmod tempor incididunt ut labore et dolore magna aliqua feed parser '
+    u'speed entry channel item atom rss markup caf\xe9 na\xefve gr\xfc\xdfe '
+    u'\xe9t\xe9 東京 日本').split()
+
+# words that can't be encoded in every encoding are replaced in those
+latin_words = [w for w in words if all(ord(c) < 256 for c in w)]
+
+months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+formats = ('rss20', 'rdf', 'atom')
+namespaces = {
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'content': 'http://purl.org/rss/1.0/modules/content/',
+    'media': 'http://search.yahoo.com/mrss/',
+    'itunes': 'http://www.itunes.com/dtds/podcast-1.0.dtd',
+    'atom': 'http://www.w3.org/2005/Atom',
+}
+date_formats = ('rfc822', 'rfc822-offset', 'w3dtf', 'w3dtf-offset')
+
+
+class Scenario(object):
+    """The parameters of the feeds generated for one benchmark scenario."""
+
+    def __init__(self, name, format='rss20', entries=20, body_size=1024,
+            namespaces=(), date_format='rfc822', encoding='utf-8'):
+        self.name = name
+        self.format = format
+        self.entries = entries
+        self.body_size = body_size
+        self.namespaces = tuple(namespaces)
+        self.date_format = date_format
+        self.encoding = encoding
+
+    def __repr__(self):
+        return 'Scenario(%r)' % self.name
+
+scenarios = [
+    Scenario('rss20-small', entries=10, body_size=256),
+    Scenario('rss20-namespaced', entries=25, body_size=1024,
+        namespaces=('dc', 'content', 'media', 'atom')),
+    Scenario('rss20-podcast', entries=50, body_size=512,
+        namespaces=('itunes', 'media'), date_format='rfc822-offset'),
+    Scenario('rss20-latin1', entries=20, body_size=1024, namespaces=('dc',),
+        encoding='iso-8859-1'),
+    Scenario('rss20-large', entries=200, body_size=4096, namespaces=('dc', 'content')),
+    Scenario('rdf', format='rdf', entries=20, body_size=512, namespaces=('dc',),
+        date_format='w3dtf'),
+    Scenario('atom', format='atom', entries=25, body_size=2048, date_format='w3dtf'),
+    Scenario('atom-large', format='atom', entries=200, body_size=8192,
+        namespaces=('media',), date_format='w3dtf-offset'),
+]
+
+scenario_map = dict((s.name, s) for s in scenarios)
+
+
+class FeedGenerator(object):
+    """Generates feeds for a scenario from a seeded random number generator."""
+
+    def __init__(self, scenario, seed=0):
+        self.scenario = scenario
+        self.rng = random.Random('%s:%s' % (seed, scenario.name))
+        self.words = words if scenario.encoding.startswith('utf') else latin_words
+
+    def text(self, count):
+        return u' '.join(self.rng.choice(self.words) for i in range(count))
+
+    def html(self, size):
+        """An html body of roughly `size` characters with a mix of markup
+        that the html cleaner has to deal with."""
+        parts, length = [], 0
+        while length < size:
+            part = u'<p>%s <a href="http://example.com/%d" onclick="x()">%s</a> <em>%s</em></p>' % (
+                self.text(12), self.rng.randint(0, 10**6), self.text(2), self.text(3))
+            if self.rng.random() < 0.1:
+                part += u'<script>track(%d)</script><img src="/i/%d.png" style="border:0"/>' % (
+                    self.rng.randint(0, 100), self.rng.randint(0, 100))
+            parts.append(part)
+            length += len(part)
+        return u''.join(parts)
+
+    def date(self, i):
+        year, month, day = 2012, 1 + (i // 28) % 12, 1 + i % 28
+        hour, minute = self.rng.randint(0, 23), self.rng.randint(0, 59)
+        fmt = self.scenario.date_format
+        if fmt.startswith('rfc822'):
+            tz = '+0100' if fmt == 'rfc822-offset' else 'GMT'
+            return u'%s, %02d %s %d %02d:%02d:00 %s' % (days[(day + 4) % 7], day,
+                months[month - 1], year, hour, minute, tz)
+        tz = '+01:00' if fmt == 'w3dtf-offset' else 'Z'
+        return u'%d-%02d-%02dT%02d:%02d:00%s' % (year, month, day, hour, minute, tz)
+
+    def declarations(self):
+        return u''.join(u' xmlns:%s="%s"' % (prefix, namespaces[prefix])
+            for prefix in self.scenario.namespaces)
+
+    def extensions(self, i, link):
+        """Namespaced elements for entry `i`."""
+        ns = self.scenario.namespaces
+        out = []
+        if 'dc' in ns:
+            out.append(u'<dc:creator>%s</dc:creator>' % self.text(2))
+        if 'content' in ns:
+            out.append(u'<content:encoded><![CDATA[%s]]></content:encoded>'
+                % self.html(self.scenario.body_size))
+        if 'media' in ns:
+            out.append(u'<media:content url="%s.jpg" medium="image" width="640" height="480">'
+                u'<media:thumbnail url="%s-t.jpg" width="75" height="50"/></media:content>' % (link, link))
+        if 'itunes' in ns:
+            out.append(u'<itunes:author>%s</itunes:author><itunes:summary>%s</itunes:summary>'
+                % (self.text(2), escape(self.text(20))))
+            out.append(u'<enclosure url="%s.mp3" length="%d" type="audio/mpeg"/>'
+                % (link, self.rng.randint(10**5, 10**8)))
+        if 'atom' in ns:
+            out.append(u'<atom:link rel="related" href="%s/related"/>' % link)
+        return u''.join(out)
+
+    def rss_item(self, i):
+        link = u'http://example.com/%d/%d' % (i, self.rng.randint(0, 10**6))
+        body = self.html(self.scenario.body_size // 2)
+        return (u'<item><title>%s</title><link>%s</link><guid isPermaLink="false">%s#%d</guid>'
+            u'<pubDate>%s</pubDate><description>%s</description>%s</item>' % (
+            escape(self.text(6)), link, link, i, self.date(i), escape(body),
+            self.extensions(i, link)))
+
+    def rdf_item(self, i):
+        link = u'http://example.com/%d/%d' % (i, self.rng.randint(0, 10**6))
+        return (u'<item rdf:about="%s"><title>%s</title><link>%s</link><dc:date>%s</dc:date>'
+            u'<description>%s</description>%s</item>' % (link, escape(self.text(6)), link,
+            self.date(i), escape(self.html(self.scenario.body_size // 2)),
+            self.extensions(i, link)))
+
+    def atom_entry(self, i):
+        link = u'http://example.com/%d/%d' % (i, self.rng.randint(0, 10**6))
+        return (u'<entry><title>%s</title><link rel="alternate" type="text/html" href="%s"/>'
+            u'<id>tag:example.com,2012:%d</id><updated>%s</updated><author><name>%s</name>'
+            u'<email>author%d@example.com</email></author><summary>%s</summary>'
+            u'<content type="html">%s</content>%s</entry>' % (escape(self.text(6)), link, i,
+            self.date(i), self.text(2), i, escape(self.text(30)),
+            escape(self.html(self.scenario.body_size)), self.extensions(i, link)))
+
+    def feed(self):
+        """Return one encoded feed document."""
+        s = self.scenario
+        decl = u'<?xml version="1.0" encoding="%s"?>\n' % s.encoding
+        title, nsdecl = escape(self.text(4)), self.declarations()
+        if s.format == 'rss20':
+            items = u''.join(self.rss_item(i) for i in range(s.entries))
+            doc = (u'<rss version="2.0"%s><channel><title>%s</title><link>http://example.com/</link>'
+                u'<description>%s</description><language>en-us</language><generator>corpus</generator>'
+                u'<lastBuildDate>%s</lastBuildDate>%s</channel></rss>' % (nsdecl, title,
+                escape(self.text(12)), self.date(0), items))
+        elif s.format == 'rdf':
+            items = u''.join(self.rdf_item(i) for i in range(s.entries))
+            if 'dc' not in s.namespaces:
+                nsdecl += u' xmlns:dc="%s"' % namespaces['dc']
+            doc = (u'<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" '
+                u'xmlns="http://purl.org/rss/1.0/"%s><channel rdf:about="http://example.com/">'
+                u'<title>%s</title><link>http://example.com/</link><description>%s</description>'
+                u'</channel>%s</rdf:RDF>' % (nsdecl, title, escape(self.text(12)), items))
+        elif s.format == 'atom':
+            items = u''.join(self.atom_entry(i) for i in range(s.entries))
+            doc = (u'<feed xmlns="http://www.w3.org/2005/Atom"%s><title>%s</title>'
+                u'<subtitle>%s</subtitle><link rel="alternate" href="http://example.com/"/>'
+                u'<id>tag:example.com,2012:feed</id><updated>%s</updated>'
+                u'<generator uri="http://example.com/corpus">corpus</generator>%s</feed>' % (
+                nsdecl, title, escape(self.text(12)), self.date(0), items))
+        else:
+            raise ValueError("Unknown feed format %r" % s.format)
+        return (decl + doc).encode(s.encoding)
+
+
+def generate(scenario, count=10, seed=0):
+    """Return `count` feeds for a scenario (a Scenario or a scenario name)."""
+    if not isinstance(scenario, Scenario):
+        scenario = scenario_map[scenario]
+    generator = FeedGenerator(scenario, seed)
+    return [generator.feed() for i in range(count)]
+
+
+def build(count=10, seed=0, names=None):
+    """Return a list of (scenario, feeds) for the named scenarios, or all."""
+    chosen = [scenario_map[n] for n in names] if names else scenarios
+    return [(s, generate(s, count, seed)) for s in chosen]
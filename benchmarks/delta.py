@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks speedparser.delta.parse_delta against a full parse on the
+large corpus scenarios, re-parsing a feed with none, a few or all of its
+entries changed since the previous parse.  Changed entries get a new title,
+so their raw xml (and fingerprint) differs but their keys do not.
+
+Run with `python -m benchmarks.delta [--repeat N]`."""
+
+import sys
+import argparse
+
+from speedparser import parse
+from speedparser.delta import parse_delta
+from benchmarks import corpus
+from benchmarks.runner import best
+
+
+def change_titles(document, count):
+    """Change the title of the first `count` entries of a corpus document."""
+    parts = document.split(b'<title>')
+    # parts[1] is the feed's title
+    for i in range(2, min(count + 2, len(parts))):
+        parts[i] = b'changed ' + parts[i]
+    return b'<title>'.join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delta parsing.")
+    parser.add_argument('--scenarios', nargs='+', default=['rss20-large', 'atom-large'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    sys.stdout.write("%-16s %10s %14s %14s\n" % ('scenario', 'changed', 'parse ms', 'delta ms'))
+    for name in args.scenarios:
+        document = corpus.generate(name, 1)[0]
+        result, state = parse_delta(document)
+        total = len(result.entries)
+        for count in (0, total // 10, total):
+            changed = change_titles(document, count)
+            if len(parse_delta(changed, state)[0].changed) != count:
+                raise AssertionError("expected %d changed entries" % count)
+            full = best(lambda: parse(changed), args.repeat)
+            delta = best(lambda: parse_delta(changed, state), args.repeat)
+            sys.stdout.write("%-16s %10d %14.1f %14.1f\n" % (name, count, full * 1000,
+                delta * 1000))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A differential harness that runs feedparser and speedparser over the same
+corpus and reports, for every entry field, how often speedparser agrees with
+feedparser, alongside how much faster it was on each feed.  Agreement uses
+the same comparisons as the compatibility tests in tests/speedparsertests.py
+(a field is only compared where feedparser produced it).  Feeds speedparser
+could not parse are the ones that would fall back to feedparser;  they are
+listed with what that fallback costs.
+
+Runs over the synthetic corpus by default, or over files (plain or
+compressed) given on the command line:
+
+    python -m benchmarks.differential feeds/*.dat
+
+Requires feedparser."""
+
+import sys
+import json
+import argparse
+
+import feedparser
+
+import speedparser
+from speedparser.speedparser import iter_decompressed
+from benchmarks import corpus
+from benchmarks.runner import clock, median
+from tests.speedparsertests import TestCaseBase
+
+
+class Comparator(TestCaseBase):
+    """Turns the assertion helpers of the compatibility tests into checks."""
+
+    def runTest(self):
+        pass
+
+    def title(self, fpe, spe):
+        self.assertPrettyClose(fpe.title, spe.title)
+
+    def link(self, fpe, spe):
+        self.assertSameLinks(fpe.link, spe.link)
+
+    def author(self, fpe, spe):
+        self.assertSameEmail(fpe.author, spe.author)
+
+    def date(self, fpe, spe):
+        self.assertSameTime(fpe.updated_parsed, spe.updated_parsed)
+
+    def summary(self, fpe, spe):
+        if len(fpe.summary) < 5 and len(spe.summary.replace(' ', '')) < 20:
+            return
+        self.assertPrettyClose(fpe.summary, spe.summary)
+
+    def content(self, fpe, spe):
+        self.assertPrettyClose(fpe.content[0]['value'], spe.content[0]['value'])
+
+    def agrees(self, field, fpe, spe):
+        try:
+            getattr(self, field)(fpe, spe)
+        except (AssertionError, AttributeError, KeyError, IndexError, TypeError):
+            return False
+        return True
+
+# field name, and whether feedparser's entry has something to compare
+fields = [
+    ('title', lambda e: 'title' in e),
+    ('link', lambda e: 'link' in e),
+    ('author', lambda e: 'author' in e),
+    ('date', lambda e: 'updated' in e and e.get('updated_parsed', None)),
+    ('summary', lambda e: 'summary' in e),
+    ('content', lambda e: 'content' in e),
+]
+
+
+def timed(func, document):
+    t0 = clock()
+    result = func(document)
+    return result, clock() - t0
+
+
+def compare_feed(name, document, comparator):
+    """Parse one document with both parsers;  returns a row dict with times
+    and per-field (compared, agreed) counts."""
+    fpresult, fptime = timed(feedparser.parse, document)
+    spresult, sptime = timed(speedparser.parse, document)
+    row = {'name': name, 'size': len(document), 'fp_time': fptime, 'sp_time': sptime,
+        'speedup': fptime / sptime if sptime else 0.0,
+        'fp_bozo': bool(fpresult.get('bozo', 0)), 'sp_bozo': bool(spresult.get('bozo', 0)),
+        'entries': len(fpresult.entries), 'sp_entries': len(spresult.entries),
+        'fields': dict((f, [0, 0]) for f, _ in fields)}
+    if row['sp_bozo']:
+        return row
+    for fpe, spe in zip(fpresult.entries, spresult.entries):
+        for field, present in fields:
+            if present(fpe):
+                counts = row['fields'][field]
+                counts[0] += 1
+                counts[1] += comparator.agrees(field, fpe, spe)
+    return row
+
+
+def run(documents):
+    """Compare every (name, document) pair;  returns a list of rows."""
+    comparator = Comparator()
+    return [compare_feed(name, doc, comparator) for name, doc in documents]
+
+
+def summarize(rows):
+    """Overall agreement per field, speedups, and the fallback cost."""
+    parsed = [r for r in rows if not r['sp_bozo']]
+    fallbacks = [r for r in rows if r['sp_bozo'] and not r['fp_bozo']]
+    agreement = {}
+    for field, _ in fields:
+        compared = sum(r['fields'][field][0] for r in parsed)
+        agreed = sum(r['fields'][field][1] for r in parsed)
+        agreement[field] = {'compared': compared, 'agreed': agreed,
+            'rate': agreed / float(compared) if compared else None}
+    counts = [r for r in parsed if r['entries'] == r['sp_entries']]
+    fp_total = sum(r['fp_time'] for r in rows)
+    sp_total = sum(r['sp_time'] for r in parsed) + sum(r['fp_time'] for r in fallbacks)
+    return {
+        'feeds': len(rows),
+        'fallbacks': len(fallbacks),
+        'entry_count_agreement': len(counts) / float(len(parsed)) if parsed else None,
+        'agreement': agreement,
+        'median_speedup': median([r['speedup'] for r in parsed]) if parsed else None,
+        'speedup_with_fallback': fp_total / sp_total if sp_total else None,
+        'fallback_time': sum(r['fp_time'] for r in fallbacks),
+    }
+
+
+def report(rows, out=sys.stdout, worst=10):
+    s = summarize(rows)
+    out.write("%d feeds, %d would fall back to feedparser\n" % (s['feeds'], s['fallbacks']))
+    if s['median_speedup'] is not None:
+        out.write("median speedup %.1fx;  %.1fx overall counting fallbacks\n" % (
+            s['median_speedup'], s['speedup_with_fallback']))
+        out.write("entry counts agree on %.1f%% of feeds\n\n" % (100 * s['entry_count_agreement']))
+    out.write("%-10s %10s %10s %8s\n" % ('field', 'compared', 'agreed', 'rate'))
+    for field, _ in fields:
+        a = s['agreement'][field]
+        rate = '%7.1f%%' % (100 * a['rate']) if a['rate'] is not None else '%8s' % '-'
+        out.write("%-10s %10d %10d %s\n" % (field, a['compared'], a['agreed'], rate))
+    fallbacks = sorted([r for r in rows if r['sp_bozo'] and not r['fp_bozo']],
+        key=lambda r: -r['fp_time'])
+    if fallbacks:
+        out.write("\ncostliest fallbacks (%.1f ms in total):\n" % (s['fallback_time'] * 1000))
+        for r in fallbacks[:worst]:
+            out.write("  %-40s %10.1f ms\n" % (r['name'], r['fp_time'] * 1000))
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return b''.join(iter_decompressed(iter(lambda: f.read(65536), b'')))
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Compare speedparser with feedparser.")
+    parser.add_argument('paths', nargs='*', help="feed files (default: synthetic corpus)")
+    parser.add_argument('-n', '--feeds', type=int, default=5,
+        help="feeds per scenario of the synthetic corpus")
+    parser.add_argument('--json', help="write per-feed rows and the summary to this file")
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    if args.paths:
+        documents = ((path, read(path)) for path in args.paths)
+    else:
+        documents = [('%s-%d' % (s.name, i), doc) for s, docs in corpus.build(args.feeds)
+            for i, doc in enumerate(docs)]
+    rows = run(documents)
+    report(rows)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summarize(rows), 'feeds': rows}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Micro-benchmarks for FeedParserDict key access.  The statements cover the
+access patterns of SpeedParserEntriesRss20.parse_entry and the parse_*
+handlers (membership probes that mostly miss, aliased keys, setdefault on
+list fields) and of code consuming results (attribute access, get with a
+default).  Each available implementation is timed:  the bundled
+feedparsercompat version, feedparser's own if it is installed, and a plain
+dict as a floor.
+
+Run with `python -m benchmarks.feedparserdict [number]`."""
+
+import sys
+import timeit
+
+from speedparser import feedparsercompat
+
+implementations = {
+    'dict': dict,
+    'feedparsercompat': feedparsercompat.FeedParserDict,
+}
+
+try:
+    import feedparser
+    implementations['feedparser'] = feedparser.FeedParserDict
+except ImportError:
+    pass
+
+entry_data = {
+    'title': u'An entry title',
+    'link': u'http://example.com/2012/01/an-entry',
+    'id': u'http://example.com/?p=1234',
+    'author': u'someone (someone@example.com)',
+    'updated': u'Thu, 19 Jan 2012 14:00:00 GMT',
+    'summary': u'<p>The summary</p>',
+    'content': [{'value': u'<p>The content</p>'}],
+    'links': [{'href': u'http://example.com/a.mp3', 'rel': 'enclosure'}],
+}
+
+# (name, statement, whether it needs FeedParserDict's aliases or attributes)
+patterns = [
+    ('contains hit', "'title' in e", False),
+    ('contains miss', "'comments' in e", False),
+    ('contains alias', "'guid' in e", True),
+    ('contains alias miss', "'date_parsed' in e", True),
+    ('getitem', "e['title']", False),
+    ('getitem alias', "e['guid']", True),
+    ('getitem list alias', "e['description']", True),
+    ('get hit', "e.get('summary', None)", False),
+    ('get miss', "e.get('comments', None)", False),
+    ('setitem', "e['title'] = u'x'", False),
+    ('setitem alias', "e['guid'] = u'x'", True),
+    ('setdefault hit', "e.setdefault('links', [])", False),
+    ('setdefault miss', "e.setdefault('media_content', []); del e['media_content']", False),
+    ('attribute', "e.title", True),
+    ('attribute alias', "e.guid", True),
+]
+
+
+def make_entry(name):
+    return implementations[name](entry_data)
+
+
+def time_pattern(name, stmt, number, repeat=5):
+    """Return the best time in nanoseconds per execution of stmt."""
+    setup = "from benchmarks.feedparserdict import make_entry; e = make_entry(%r)" % name
+    timer = timeit.Timer(stmt, setup)
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def run(number=100000):
+    """Time every pattern against every implementation;  returns a list of
+    (pattern, {implementation: ns/op}) tuples."""
+    results = []
+    for pattern, stmt, fpd_only in patterns:
+        timings = {}
+        for name in sorted(implementations):
+            if fpd_only and name == 'dict':
+                continue
+            timings[name] = time_pattern(name, stmt, number)
+        results.append((pattern, timings))
+    return results
+
+
+def main(argv):
+    number = int(argv[1]) if len(argv) > 1 else 100000
+    names = sorted(implementations)
+    print("%-22s %s" % ('ns/op', ' '.join('%18s' % n for n in names)))
+    for pattern, timings in run(number):
+        cols = []
+        for name in names:
+            if name in timings:
+                cols.append('%18.1f' % timings[name])
+            else:
+                cols.append('%18s' % '-')
+        print("%-22s %s" % (pattern, ' '.join(cols)))
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Measures how long a fresh interpreter takes to import speedparser, and to
+import it and parse a small feed, which is what a short-lived worker pays
+before doing any work.  Each statement runs in its own interpreter, over
+several runs;  the time of an interpreter that imports nothing is reported
+as a baseline, and the heavy optional modules each statement ended up
+importing are listed.
+
+Run with `python -m benchmarks.importtime [--runs N]`."""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from benchmarks.runner import clock, median
+
+feed = ('<?xml version="1.0"?><rss version="2.0"><channel><title>Import</title>'
+    '<item><title>One</title><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate>'
+    '<description>&lt;p&gt;first&lt;/p&gt;</description></item></channel></rss>')
+
+statements = [
+    ('python', 'pass'),
+    ('import speedparser', 'import speedparser'),
+    ('import and parse', 'import speedparser; speedparser.parse(%r)' % feed),
+    ('with use_feedparser', 'import speedparser; speedparser.use_feedparser(); '
+        'speedparser.parse(%r)' % feed),
+]
+
+heavy_modules = ['feedparser', 'chardet', 'lxml.html', 'lxml.html.clean']
+
+reporter = """
+%s
+import sys, json
+sys.stdout.write(json.dumps([m for m in %r if m in sys.modules]))
+"""
+
+
+def measure(statement, runs):
+    """Run statement in `runs` fresh interpreters;  returns the median wall
+    time of an interpreter and the heavy modules the statement imported."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    times, modules = [], []
+    for _ in range(runs):
+        t0 = clock()
+        out = subprocess.check_output([sys.executable, '-c', reporter % (statement, heavy_modules)],
+            env=env)
+        times.append(clock() - t0)
+        modules = json.loads(out)
+    return median(times), modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the import time of speedparser.")
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args(argv)
+    for name, statement in statements:
+        try:
+            elapsed, modules = measure(statement, args.runs)
+        except subprocess.CalledProcessError:
+            sys.stdout.write("%-22s %10s\n" % (name, 'failed'))
+            continue
+        sys.stdout.write("%-22s %10.1f ms   %s\n" % (name, elapsed * 1000, ', '.join(modules)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks innertext on Atom feeds with inline XHTML content, where it is
+a large part of parsing when html is not cleaned.  innertext serializes a node
+once and slices out its children;  it is timed against serializing each
+child separately, as it used to, over the content nodes of every entry, and
+then as part of whole parses.  The paragraphs of the content are either its
+children or wrapped in a single div.  The feeds declare a few namespaces on
+their root, which the per-child serialization repeats on every child.
+
+Run with `python -m benchmarks.innertext [--entries N] [--paragraphs N]`."""
+
+import sys
+import random
+import argparse
+
+from lxml import etree
+
+from speedparser import parse
+from speedparser.speedparser import innertext, strip_namespace
+from benchmarks.runner import best
+
+words = u'lorem ipsum dolor sit amet consectetur adipiscing elit café naïve'.split()
+
+paragraph = u'<p>%s <a href="http://example.com/%d">%s</a> %s <em>%s</em> &amp; %s</p>'
+
+
+def innertext_per_child(node):
+    """innertext as it was, with a tostring per child."""
+    if not len(node):
+        return node.text
+    return (node.text or '') + ''.join([etree.tostring(c) for c in node]) + (node.tail or '')
+
+
+def xhtml_feed(entries, paragraphs, wrapped=False, seed=0):
+    rand = random.Random(seed)
+    text = lambda n: u' '.join(rand.choice(words) for _ in range(n))
+    out = [u'<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom" '
+        u'xmlns:media="http://search.yahoo.com/mrss/" xmlns:dc="http://purl.org/dc/elements/1.1/" '
+        u'xmlns:thr="http://purl.org/syndication/thread/1.0">'
+        u'<title>Inline XHTML</title><link href="http://example.com/"/>']
+    for i in range(entries):
+        body = u''.join(paragraph % (text(8), i, text(2), text(6), text(1), text(5))
+            for _ in range(paragraphs))
+        if wrapped:
+            body = u'<div xmlns="http://www.w3.org/1999/xhtml">%s</div>' % body
+        out.append(u'<entry><title>Entry %d</title><link href="http://example.com/%d"/>'
+            u'<id>http://example.com/%d</id><updated>2012-01-19T14:00:00Z</updated>'
+            u'<content type="xhtml">%s</content>'
+            u'</entry>' % (i, i, i, body))
+    out.append(u'</feed>')
+    return u''.join(out).encode('utf-8')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark innertext on inline XHTML.")
+    parser.add_argument('--entries', type=int, default=50)
+    parser.add_argument('--paragraphs', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    for wrapped in (False, True):
+        document = xhtml_feed(args.entries, args.paragraphs, wrapped)
+        root = etree.fromstring(strip_namespace(document)[1])
+        nodes = root.xpath('/feed/entry/content')
+        each = lambda func: lambda: [func(node) for node in nodes]
+        sys.stdout.write("%d entries, %d bytes, paragraphs %s\n" % (len(nodes), len(document),
+            'in a div' if wrapped else 'directly in content'))
+        sys.stdout.write("  %-28s %10.2f ms\n" % ('innertext, per child',
+            best(each(innertext_per_child), args.repeat) * 1000))
+        sys.stdout.write("  %-28s %10.2f ms\n" % ('innertext',
+            best(each(innertext), args.repeat) * 1000))
+        for clean_html in (False, True):
+            sys.stdout.write("  %-28s %10.2f ms\n" % ('parse, clean_html=%s' % clean_html,
+                best(lambda: parse(document, clean_html=clean_html), args.repeat) * 1000))
+
+if __name__ == '__main__':
+    main()
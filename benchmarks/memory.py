@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Memory benchmarks.  Each case parses one synthetic feed of a given entry
+count and body size in a fresh child process and reports:
+
+ * rss:  growth of the child's peak resident set size during the parse
+ * traced:  peak bytes allocated by python during the parse (tracemalloc,
+   python 3.4+ only)
+ * per entry:  the larger of the two divided by the number of entries
+
+for the in-memory parse() path, the streaming parse_file() path (reading a
+gzipped copy of the feed from disk) and parse() with compact entries.  With
+--budget-per-entry or --budget-peak, exits non-zero if any case goes over.
+
+Run with `python -m benchmarks.memory [options]`;  see --help."""
+
+import os
+import sys
+import gzip
+import argparse
+import tempfile
+import multiprocessing
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import speedparser
+from benchmarks import corpus
+
+paths = ('parse', 'parse_file', 'compact')
+sizes = [(10, 1024), (100, 1024), (1000, 1024), (100, 16384)]
+
+
+def max_rss():
+    """Peak resident set size of this process in bytes."""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, os x bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+warmup_feed = corpus.generate('rss20-small', 1)[0]
+
+
+def measure(path, document, filename):
+    """Parse the document by `path`;  runs in the child process.  A small
+    feed is parsed first so one-time costs (lazy imports, compiled regexes,
+    etc.) are not counted against the document."""
+    speedparser.parse(warmup_feed)
+    speedparser.parse(warmup_feed, result_type='compact')
+    rss0 = max_rss()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    if path == 'parse':
+        result = speedparser.parse(document)
+    elif path == 'parse_file':
+        result = speedparser.parse_file(filename)
+    else:
+        result = speedparser.parse(document, result_type='compact')
+    traced = None
+    if tracemalloc is not None:
+        traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'rss': max_rss() - rss0, 'traced': traced,
+        'entries': len(result.entries), 'bozo': result.bozo}
+
+
+def child(conn, path, document, filename):
+    try:
+        conn.send(measure(path, document, filename))
+    finally:
+        conn.close()
+
+
+def measure_in_child(path, document, filename):
+    """Run measure in a fresh process, so that peak rss of earlier cases does
+    not hide the peak of this one."""
+    parent, conn = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=child, args=(conn, path, document, filename))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def run(cases=sizes, path_names=paths, seed=0):
+    """Return a row dict for each (entries, body size, path) case."""
+    rows = []
+    for entries, body_size in cases:
+        scenario = corpus.Scenario('memory', entries=entries, body_size=body_size,
+            namespaces=('dc', 'content', 'media'))
+        document = corpus.generate(scenario, 1, seed)[0]
+        fd, filename = tempfile.mkstemp(suffix='.xml.gz')
+        try:
+            with os.fdopen(fd, 'wb') as raw:
+                f = gzip.GzipFile(fileobj=raw, mode='wb')
+                f.write(document)
+                f.close()
+            for path in path_names:
+                m = measure_in_child(path, document, filename)
+                peak = max(m['rss'], m['traced'] or 0)
+                rows.append({'entries': entries, 'body_size': body_size, 'path': path,
+                    'size': len(document), 'rss': m['rss'], 'traced': m['traced'],
+                    'per_entry': peak / float(max(m['entries'], 1)), 'peak': peak})
+        finally:
+            os.unlink(filename)
+    return rows
+
+
+def over_budget(rows, per_entry=None, peak=None):
+    """Return the rows that exceed a budget (in bytes)."""
+    return [r for r in rows if (per_entry and r['per_entry'] > per_entry) or
+        (peak and r['peak'] > peak)]
+
+
+def report(rows, out=sys.stdout):
+    kb = lambda v: '%10.1f' % (v / 1024.0) if v is not None else '%10s' % '-'
+    out.write("%8s %8s %-11s %10s %10s %10s %12s\n" % ('entries', 'body', 'path',
+        'doc KB', 'rss KB', 'traced KB', 'B/entry'))
+    for r in rows:
+        out.write("%8d %8d %-11s %s %s %s %12.0f\n" % (r['entries'], r['body_size'],
+            r['path'], kb(r['size']), kb(r['rss']), kb(r['traced']), r['per_entry']))
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Measure speedparser's memory use.")
+    parser.add_argument('-p', '--path', action='append', dest='paths', choices=paths,
+        help="parse path to measure (default: all)")
+    parser.add_argument('--budget-per-entry', type=int,
+        help="fail if a case uses more than this many bytes per entry")
+    parser.add_argument('--budget-peak', type=int,
+        help="fail if a case's peak exceeds this many bytes")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed")
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    rows = run(sizes, args.paths or paths, args.seed)
+    report(rows)
+    failed = over_budget(rows, args.budget_per_entry, args.budget_peak)
+    for r in failed:
+        sys.stdout.write("over budget: %(entries)d entries, %(body_size)d body, %(path)s "
+            "(%(peak)d bytes, %(per_entry).0f bytes/entry)\n" % r)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks parsing one very large full-text feed with its html cleaned
+sequentially and on process and thread pools of a few sizes (see parse's
+clean_pool).  Pooled results are checked against the sequential one before
+anything is timed.  The gain depends on the cores available:  with one
+core the pool only adds the cost of shipping texts to the workers.
+
+Run with `python -m benchmarks.parallelclean [--entries N] [--workers N ...]`."""
+
+import sys
+import argparse
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from speedparser import parse
+from benchmarks import corpus
+from benchmarks.runner import best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark parallel html cleaning.")
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--body-size', type=int, default=4096)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    scenario = corpus.Scenario('fulltext', entries=args.entries, body_size=args.body_size,
+        namespaces=('dc', 'content'))
+    document = corpus.generate(scenario, 1)[0]
+    expected = parse(document).entries
+    sys.stdout.write("%d entries, %d bytes\n" % (args.entries, len(document)))
+    sys.stdout.write("  %-24s %10.1f ms\n" % ('sequential',
+        best(lambda: parse(document), args.repeat) * 1000))
+    for kind, pool_class in (('processes', Pool), ('threads', ThreadPool)):
+        for workers in args.workers:
+            pool = pool_class(workers)
+            try:
+                if parse(document, clean_pool=pool).entries != expected:
+                    raise AssertionError("%s pool gave different entries" % kind)
+                elapsed = best(lambda: parse(document, clean_pool=pool), args.repeat)
+            finally:
+                pool.terminate()
+            sys.stdout.write("  %-24s %10.1f ms\n" % ('%d %s' % (workers, kind),
+                elapsed * 1000))
+
+if __name__ == '__main__':
+    main()
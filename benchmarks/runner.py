@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Times speedparser over the synthetic corpus.  Every scenario is parsed
+with html cleaning on ("clean") and off ("noclean");  after some warmup
+passes each pass over a scenario's feeds is timed separately, and the
+samples are summarized as median and p95 seconds per feed, feeds/sec and
+MB/sec (both from the median).
+
+Run with `python -m benchmarks [options]`;  see --help."""
+
+import sys
+import math
+import time
+import argparse
+
+import speedparser
+from benchmarks import corpus
+
+clock = getattr(time, 'perf_counter', time.time)
+
+modes = {
+    'clean': {'clean_html': True},
+    'noclean': {'clean_html': False},
+}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    rank = max(int(math.ceil(pct / 100.0 * len(ordered))), 1)
+    return ordered[rank - 1]
+
+
+def median(samples):
+    ordered = sorted(samples)
+    mid = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[mid]
+    return (ordered[mid - 1] + ordered[mid]) / 2.0
+
+
+def best(func, repeat=3, budget=None):
+    """The fastest of `repeat` calls of func, in seconds, or None if a call
+    takes longer than `budget` seconds."""
+    fastest = None
+    for _ in range(repeat):
+        t0 = clock()
+        func()
+        elapsed = clock() - t0
+        if budget is not None and elapsed > budget:
+            return None
+        fastest = elapsed if fastest is None else min(fastest, elapsed)
+    return fastest
+
+
+def summarize(samples, feeds, size):
+    """Summarize per-pass timings of `feeds` documents totalling `size` bytes."""
+    per_feed = [s / feeds for s in samples]
+    med = median(samples)
+    return {
+        'samples': len(samples),
+        'median': median(per_feed),
+        'p95': percentile(per_feed, 95),
+        'min': min(per_feed),
+        'feeds_per_sec': feeds / med if med else 0.0,
+        'mb_per_sec': size / med / (1024 * 1024) if med else 0.0,
+    }
+
+
+def time_passes(func, documents, repeat=5, warmup=1):
+    """Call func on every document, `warmup` untimed passes then `repeat`
+    timed ones;  returns the seconds taken by each timed pass."""
+    for i in range(warmup):
+        for doc in documents:
+            func(doc)
+    samples = []
+    for i in range(repeat):
+        t0 = clock()
+        for doc in documents:
+            func(doc)
+        samples.append(clock() - t0)
+    return samples
+
+
+def run(names=None, mode_names=('clean', 'noclean'), count=10, repeat=5,
+        warmup=1, seed=0, parse=speedparser.parse):
+    """Benchmark scenarios;  returns a list of (scenario name, mode, summary)."""
+    rows = []
+    for scenario, documents in corpus.build(count, seed, names):
+        size = sum(len(d) for d in documents)
+        for mode in mode_names:
+            kwargs = modes[mode]
+            samples = time_passes(lambda d: parse(d, **kwargs), documents, repeat, warmup)
+            rows.append((scenario.name, mode, summarize(samples, len(documents), size)))
+    return rows
+
+
+def report(rows, out=sys.stdout):
+    out.write("%-18s %-8s %10s %10s %10s %9s\n" % (
+        'scenario', 'mode', 'median ms', 'p95 ms', 'feeds/s', 'MB/s'))
+    for name, mode, s in rows:
+        out.write("%-18s %-8s %10.3f %10.3f %10.1f %9.2f\n" % (name, mode,
+            s['median'] * 1000, s['p95'] * 1000, s['feeds_per_sec'], s['mb_per_sec']))
+
+
+def arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark speedparser on a synthetic corpus.")
+    parser.add_argument('-s', '--scenario', action='append', dest='scenarios',
+        choices=sorted(corpus.scenario_map), help="scenario to run (default: all)")
+    parser.add_argument('-m', '--mode', action='append', dest='modes',
+        choices=sorted(modes), help="cleaning mode to run (default: all)")
+    parser.add_argument('-n', '--feeds', type=int, default=10, help="feeds per scenario")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="timed passes")
+    parser.add_argument('-w', '--warmup', type=int, default=1, help="untimed warmup passes")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed")
+    return parser
+
+
+def main(argv=None):
+    args = arg_parser().parse_args(argv)
+    rows = run(args.scenarios, args.modes or ('clean', 'noclean'), args.feeds,
+        args.repeat, args.warmup, args.seed)
+    report(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Compare speedparser.serialize against pickle and json for transporting
+a parse result from the synthetic corpus:  serialized size, dump time and
+load time.  json is one-way (dates and exceptions do not come back), so it
+is only a reference point.
+
+Run with `python -m benchmarks.serialization [entries] [number]`."""
+
+import sys
+import json
+import timeit
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import speedparser
+from speedparser import serialize
+from benchmarks import corpus
+
+
+def sample_result(entries):
+    scenario = corpus.Scenario('serialization', entries=entries, body_size=512,
+        namespaces=('dc', 'media', 'itunes'))
+    return speedparser.parse(corpus.generate(scenario, 1)[0])
+
+
+def json_dumps(result):
+    return json.dumps(result, default=serialize.json_default)
+
+
+codecs = [
+    ('serialize', serialize.dumps, serialize.loads),
+    ('pickle', lambda r: pickle.dumps(r, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    ('json', json_dumps, json.loads),
+]
+
+
+def run(entries=100, number=50):
+    """Return (codec, size, dump seconds, load seconds) for each codec."""
+    result = sample_result(entries)
+    rows = []
+    for name, dumps, loads in codecs:
+        data = dumps(result)
+        dump = min(timeit.repeat(lambda: dumps(result), repeat=3, number=number)) / number
+        load = min(timeit.repeat(lambda: loads(data), repeat=3, number=number)) / number
+        rows.append((name, len(data), dump, load))
+    return rows
+
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 100
+    number = int(argv[2]) if len(argv) > 2 else 50
+    print("%d entries" % entries)
+    print("%-10s %10s %12s %12s" % ('codec', 'bytes', 'dump ms', 'load ms'))
+    for name, size, dump, load in run(entries, number):
+        print("%-10s %10d %12.3f %12.3f" % (name, size, dump * 1000, load * 1000))
+
+if __name__ == '__main__':
+    main(sys.argv)
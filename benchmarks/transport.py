@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Benchmarks getting parse results from worker processes back to the
+parent:  as pickled results (what Pool.map does with parse), as
+speedparser.serialize bytes, and through speedparser.sharedmem, either
+reading every entry or only the feed and the first entry.  The time is that
+of a Pool.map over the corpus plus loading the results in the parent, so it
+includes parsing;  the difference between the rows is the transport.
+
+Run with `python -m benchmarks.transport [--workers N] [--count N]`."""
+
+import sys
+import argparse
+from multiprocessing import Pool
+
+from speedparser import parse, serialize, sharedmem
+from benchmarks import corpus
+from benchmarks.runner import best
+
+
+def load_pickled(results):
+    return results
+
+
+def load_bytes(results):
+    return [serialize.loads(data) for data in results]
+
+
+def load_shared(handles):
+    results = []
+    for handle in handles:
+        with sharedmem.open_result(handle) as shared:
+            results.append(shared.load())
+    return results
+
+
+def load_shared_head(handles):
+    results = []
+    for handle in handles:
+        with sharedmem.open_result(handle) as shared:
+            results.append((shared.feed, shared.entries[0] if shared.entries else None))
+    return results
+
+
+transports = [
+    ('pickle', parse, load_pickled),
+    ('serialize', serialize.parse_to_bytes, load_bytes),
+    ('shared', sharedmem.parse_to_shared, load_shared),
+    ('shared, first entry', sharedmem.parse_to_shared, load_shared_head),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark result transport from workers.")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--count', type=int, default=10, help="feeds per scenario")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    documents = [d for scenario, feeds in corpus.build(args.count) for d in feeds]
+    pool = Pool(args.workers)
+    try:
+        sys.stdout.write("%d feeds, %d workers\n" % (len(documents), args.workers))
+        for name, work, load in transports:
+            elapsed = best(lambda: load(pool.map(work, documents)), args.repeat)
+            sys.stdout.write("  %-22s %10.1f ms\n" % (name, elapsed * 1000))
+    finally:
+        pool.terminate()
+
+if __name__ == '__main__':
+    main()
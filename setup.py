@@ -36,7 +36,7 @@ setup(
 
     url='https://github.com/hiidef/speedparser/',
     license='MIT',
-    packages=find_packages(exclude=['ez_setup', 'examples', 'tests']),
+    packages=find_packages(exclude=['ez_setup', 'examples', 'tests', 'benchmarks']),
     include_package_data=True,
     zip_safe=False,
     test_suite="tests",
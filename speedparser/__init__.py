@@ -1,3 +1,5 @@
-from .speedparser import parse
+from .speedparser import parse, parse_file, parse_many, parse_feed_header, classify, ParseStats, \
+    SourceProfile, use_feedparser
 VERSION = (0,2,0)
-__all__ = ['parse', 'VERSION']
+__all__ = ['parse', 'parse_file', 'parse_many', 'parse_feed_header', 'classify', 'ParseStats',
+    'SourceProfile', 'use_feedparser', 'VERSION']
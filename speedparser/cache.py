@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A parse cache kept in an SQLite database, so it survives restarts and can
+be shared by the processes on a machine.  Results are stored in
+speedparser.serialize's format, keyed by a hash of the document and of the
+parse options that change the result;  an unchanged document is loaded
+instead of parsed again:
+
+    >>> from speedparser.cache import SqliteParseCache
+    >>> cache = SqliteParseCache('/var/cache/feeds.db', ttl=86400, max_bytes=2**30)
+    >>> result = cache.parse(document, clean_html=True)
+    >>> cache.hit_rate(), cache.counters
+
+Results older than `ttl` seconds are treated as missing and removed.  When
+the cache holds more than `max_entries` results or `max_bytes` of them, the
+least recently used are removed until it is back under 90% of the limit;
+the number and size of the results are kept up to date by triggers, so
+checking the limits does not scan the cache.  The database uses write-ahead
+logging, and a hit does not write to it:  the time a result was last used
+is kept in memory and written back in one transaction before evicting (or
+when `flush_every` hits have piled up, or the cache is closed), so readers
+in other processes are not blocked by each other.  Recency is therefore
+only as fresh as each process's last flush.  The counters are those of this
+SqliteParseCache only."""
+
+import sys
+import time
+import hashlib
+import inspect
+import sqlite3
+
+from . import speedparser as sp
+from . import serialize
+
+# parse arguments that do not change the result
+ignored_options = frozenset(['stats', 'profile', 'clean_pool', 'clean_threshold'])
+
+_spec = inspect.getargspec(sp.parse)
+parse_defaults = dict(zip(_spec.args[-len(_spec.defaults):], _spec.defaults))
+del _spec
+
+schema = """
+create table if not exists results (
+    key text primary key,
+    value blob not null,
+    size integer not null,
+    created real not null,
+    accessed real not null
+);
+create index if not exists results_accessed on results (accessed);
+create index if not exists results_created on results (created);
+create table if not exists meta (
+    name text primary key,
+    value integer not null
+);
+create trigger if not exists results_insert after insert on results begin
+    update meta set value = value + 1 where name = 'count';
+    update meta set value = value + new.size where name = 'bytes';
+end;
+create trigger if not exists results_delete after delete on results begin
+    update meta set value = value - 1 where name = 'count';
+    update meta set value = value - old.size where name = 'bytes';
+end;
+"""
+
+
+def option_value(value):
+    """A stable representation of a parse option, or None if it has none (a
+    Cleaner object, say), in which case the parse is not cached."""
+    if isinstance(value, serialize.scalar_types):
+        return repr(value)
+    if isinstance(value, sp.LazyCleaner):
+        return 'LazyCleaner(%r)' % sorted(value.kwargs.items())
+    return None
+
+
+def cache_key(document, options):
+    """The key of document parsed with options (keyword arguments to parse),
+    or None if the options can't be part of a key."""
+    opts = dict(parse_defaults, **options)
+    if opts['clean_html'] is True:
+        opts['clean_html'] = sp.default_cleaner
+    parts = []
+    for name in sorted(opts):
+        if name in ignored_options:
+            continue
+        value = option_value(opts[name])
+        if value is None:
+            return None
+        parts.append('%s=%s' % (name, value))
+    from . import VERSION
+    # marshal's format is specific to a python version
+    parts.append('%r %r' % (VERSION, sys.version_info[:2]))
+    if isinstance(document, type(u'')):
+        document = document.encode('utf-8')
+    digest = hashlib.sha1(document)
+    digest.update(b'\0' + ';'.join(parts).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SqliteParseCache(object):
+    """Parse results stored in the SQLite database at path."""
+
+    def __init__(self, path, ttl=None, max_bytes=None, max_entries=None, timeout=30.0,
+            flush_every=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        # key -> time of the last hit, not yet written to the database
+        self.accessed = {}
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute('pragma journal_mode=wal')
+        self.db.execute('pragma synchronous=normal')
+        # so the delete trigger sees the rows "insert or replace" replaces
+        self.db.execute('pragma recursive_triggers=on')
+        self.db.executescript(schema)
+        self.db.execute('begin immediate')
+        if self.db.execute('select count(*) from meta').fetchone()[0] < 2:
+            # a new database, or one made before meta was;  counted once
+            self.db.execute("insert or replace into meta select 'count', count(*) from results")
+            self.db.execute("insert or replace into meta select 'bytes', coalesce(sum(size), 0) "
+                "from results")
+        self.db.execute('commit')
+        self.counters = {}
+        self.reset()
+
+    def reset(self):
+        """Zero the counters;  cached results are kept."""
+        self.counters = dict(hits=0, misses=0, stores=0, evictions=0, expired=0,
+            uncacheable=0)
+
+    def get(self, key):
+        """Return the result stored under key, or None."""
+        row = self.db.execute('select value, created from results where key = ?',
+            (key,)).fetchone()
+        now = time.time()
+        if row is not None and self.ttl is not None and row[1] + self.ttl < now:
+            self.db.execute('delete from results where key = ?', (key,))
+            self.counters['expired'] += 1
+            row = None
+        if row is None:
+            self.counters['misses'] += 1
+            return None
+        self.counters['hits'] += 1
+        self.accessed[key] = now
+        if len(self.accessed) >= self.flush_every:
+            self.flush()
+        return serialize.loads(bytes(row[0]))
+
+    def flush(self):
+        """Write the times of the hits kept in memory to the database."""
+        if self.accessed:
+            self.db.execute('begin immediate')
+            self.write_accessed()
+            self.db.execute('commit')
+
+    def write_accessed(self):
+        self.db.executemany('update results set accessed = ? where key = ?',
+            [(t, key) for key, t in self.accessed.items()])
+        self.accessed.clear()
+
+    def size(self):
+        """Return the number of results and their total size in bytes."""
+        meta = dict(self.db.execute('select name, value from meta'))
+        return meta['count'], meta['bytes']
+
+    def put(self, key, result):
+        """Store result under key, then evict if the cache is over a limit."""
+        value = serialize.dumps(result)
+        now = time.time()
+        self.db.execute('insert or replace into results (key, value, size, created, accessed) '
+            'values (?, ?, ?, ?, ?)', (key, sqlite3.Binary(value), len(value), now, now))
+        self.counters['stores'] += 1
+        self.evict()
+
+    def evict(self):
+        """Remove expired results, then the least recently used results while
+        the cache is over a limit."""
+        if self.ttl is not None:
+            cursor = self.db.execute('delete from results where created < ?',
+                (time.time() - self.ttl,))
+            self.counters['expired'] += max(cursor.rowcount, 0)
+        if self.max_entries is None and self.max_bytes is None:
+            return
+        count, size = self.size()
+        over_entries = self.max_entries is not None and count > self.max_entries
+        over_bytes = self.max_bytes is not None and size > self.max_bytes
+        if not (over_entries or over_bytes):
+            return
+        # evict down to 90% of the limits so this doesn't run on every put
+        keep_entries = int(self.max_entries * 0.9) if self.max_entries is not None else count
+        keep_bytes = int(self.max_bytes * 0.9) if self.max_bytes is not None else size
+        self.db.execute('begin immediate')
+        try:
+            self.write_accessed()
+            count, size = self.size()
+            evict = []
+            cursor = self.db.execute('select key, size from results order by accessed')
+            for key, item_size in cursor:
+                if count <= keep_entries and size <= keep_bytes:
+                    break
+                evict.append((key,))
+                count -= 1
+                size -= item_size
+            cursor.close()
+            self.db.executemany('delete from results where key = ?', evict)
+        except Exception:
+            self.db.execute('rollback')
+            raise
+        self.db.execute('commit')
+        self.counters['evictions'] += len(evict)
+
+    def parse(self, document, **kwargs):
+        """Return the cached result of parsing document with kwargs (the
+        arguments of speedparser.parse), parsing and storing it on a miss.
+        Results cut short by a time_budget are not stored, nor are parses
+        with options that can't be part of a key, like a Cleaner object."""
+        if not isinstance(document, basestring):
+            document = b''.join(sp.iter_decompressed(document))
+        key = cache_key(document, kwargs)
+        if key is None:
+            self.counters['uncacheable'] += 1
+            return sp.parse(document, **kwargs)
+        result = self.get(key)
+        if result is None:
+            result = sp.parse(document, **kwargs)
+            if 'time_budget' not in result.get('limits_exceeded', {}):
+                self.put(key, result)
+        return result
+
+    def hit_rate(self):
+        c = self.counters
+        total = c['hits'] + c['misses']
+        return c['hits'] / float(total) if total else 0.0
+
+    def __len__(self):
+        return self.size()[0]
+
+    def clear(self):
+        self.accessed.clear()
+        self.db.execute('delete from results')
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Columnar output for batches of parsed feeds.  Rather than a list of
+results holding a FeedParserDict per entry, a ColumnBatch holds one column
+per entry field.  String columns use Apache Arrow's layout for variable
+length binary data: a contiguous utf-8 data buffer, an int32 offsets array
+with one more item than there are rows, and a validity bitmap with the least
+significant bit first.  Integer columns are int64 arrays with a validity
+bitmap.  The buffers can be handed to Arrow without copying row by row;  see
+ColumnBatch.to_pyarrow."""
+
+import calendar
+from array import array
+
+try:
+    array('q')
+    int64_typecode = 'q'
+except ValueError:
+    # python 2's array module has no 'q';  'l' is 64 bits on LP64 platforms
+    int64_typecode = 'l'
+
+
+def array_bytes(a):
+    """The raw bytes of an array;  tostring was renamed tobytes in python 3."""
+    if hasattr(a, 'tobytes'):
+        return a.tobytes()
+    return a.tostring()
+
+
+class Column(object):
+    """Base for columns;  tracks the validity bitmap and null count."""
+
+    def __init__(self):
+        self.validity = bytearray()
+        self.null_count = 0
+        self.length = 0
+
+    def _append_validity(self, valid):
+        i = self.length
+        if i % 8 == 0:
+            self.validity.append(0)
+        if valid:
+            self.validity[i >> 3] |= 1 << (i & 7)
+        else:
+            self.null_count += 1
+        self.length += 1
+
+    def is_valid(self, i):
+        return bool(self.validity[i >> 3] & (1 << (i & 7)))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def to_pylist(self):
+        return list(self)
+
+
+class StringColumn(Column):
+    """A utf-8 string column with Arrow's offsets + data buffer layout."""
+
+    def __init__(self):
+        super(StringColumn, self).__init__()
+        self.offsets = array('i', [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        if value is not None:
+            if not isinstance(value, bytes):
+                value = value.encode('utf-8')
+            self.data.extend(value)
+        self.offsets.append(len(self.data))
+        self._append_validity(value is not None)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("column index out of range")
+        if not self.is_valid(i):
+            return None
+        return bytes(self.data[self.offsets[i]:self.offsets[i+1]]).decode('utf-8')
+
+
+class Int64Column(Column):
+    """An int64 column;  nulls are stored as 0 with their validity bit off."""
+
+    def __init__(self):
+        super(Int64Column, self).__init__()
+        self.values = array(int64_typecode)
+
+    def append(self, value):
+        self.values.append(0 if value is None else value)
+        self._append_validity(value is not None)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("column index out of range")
+        if not self.is_valid(i):
+            return None
+        return self.values[i]
+
+
+def epoch(date):
+    """Return a date from a parse result as integer seconds since the epoch.
+    struct_times from feedparser's date parsing are in UTC."""
+    if date is None:
+        return None
+    if isinstance(date, (int, float)):
+        return int(date)
+    return calendar.timegm(date)
+
+
+def first_content(entry):
+    content = entry.get('content', None)
+    if content:
+        return content[0].get('value', None)
+    return None
+
+
+class ColumnBatch(object):
+    """Entries from a batch of feeds in columns.  The entries of feed `i` are
+    rows feed_offsets[i] to feed_offsets[i+1];  `bozo` has a byte for every
+    feed, set if that feed failed to parse."""
+
+    string_fields = ('title', 'link', 'guid', 'content')
+
+    def __init__(self):
+        self.columns = {
+            'title': StringColumn(),
+            'link': StringColumn(),
+            'guid': StringColumn(),
+            'updated_parsed': Int64Column(),
+            'content': StringColumn(),
+        }
+        self.feed_offsets = array('i', [0])
+        self.bozo = bytearray()
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__['columns'][key]
+        except KeyError:
+            raise AttributeError("object has no attribute '%s'" % key)
+
+    def __len__(self):
+        return self.feed_offsets[-1]
+
+    @property
+    def feed_count(self):
+        return len(self.feed_offsets) - 1
+
+    def append_result(self, result):
+        """Append the entries of a parse result as rows."""
+        columns = self.columns
+        title, link, guid = columns['title'], columns['link'], columns['guid']
+        updated, content = columns['updated_parsed'], columns['content']
+        for entry in result['entries']:
+            title.append(entry.get('title', None))
+            link.append(entry.get('link', None))
+            guid.append(entry.get('id', None))
+            updated.append(epoch(entry.get('updated_parsed', None)))
+            content.append(first_content(entry))
+        self.feed_offsets.append(self.feed_offsets[-1] + len(result['entries']))
+        self.bozo.append(1 if result.get('bozo', 0) else 0)
+
+    def to_pyarrow(self):
+        """Return the entries as a pyarrow.Table, built from the column buffers
+        without converting rows.  Requires pyarrow."""
+        import pyarrow as pa
+        arrays, names = [], []
+        for name in ('title', 'link', 'guid', 'updated_parsed', 'content'):
+            column = self.columns[name]
+            validity = pa.py_buffer(bytes(column.validity))
+            if name in self.string_fields:
+                buffers = [validity, pa.py_buffer(array_bytes(column.offsets)),
+                    pa.py_buffer(bytes(column.data))]
+                type = pa.string()
+            else:
+                buffers = [validity, pa.py_buffer(array_bytes(column.values))]
+                type = pa.int64()
+            arrays.append(pa.Array.from_buffers(type, len(column), buffers,
+                null_count=column.null_count))
+            names.append(name)
+        return pa.Table.from_arrays(arrays, names=names)
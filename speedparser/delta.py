@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Delta parsing:  parse only the entries of a feed that changed since it
+was last parsed.  The state kept between parses maps each entry's key (its
+guid or id, else its link) to a crc32 of the entry's raw xml;  an entry
+whose raw xml has the same crc32 as last time is not parsed at all, so its
+html is not cleaned and its dates are not parsed:
+
+    >>> from speedparser.delta import parse_delta
+    >>> result, state = parse_delta(document, state)
+    >>> result.added, result.changed, result.removed
+
+The state is a plain dict of strings to ints, so it pickles and serializes
+to json as is.  Entries with neither a guid nor a link are keyed by their
+crc32, so a change to one shows as a removal and an addition."""
+
+import zlib
+
+from lxml import etree
+
+from . import speedparser as sp
+
+
+def entry_key(node):
+    """The guid (or id) of an entry element, else its link, else None."""
+    link = None
+    for child in node:
+        tag = child.tag
+        if tag == 'guid' or tag == 'id':
+            if child.text and child.text.strip():
+                return child.text.strip()
+        elif tag == 'link' and link is None:
+            link = (child.text or '').strip() or child.get('href')
+    return link
+
+
+def fingerprint(node):
+    return zlib.crc32(etree.tostring(node, with_tail=False)) & 0xffffffff
+
+
+class DeltaFilter(object):
+    """The entry_filter parse_delta gives parse:  it skips the entries whose
+    fingerprint is in the previous state, and sorts the others into added
+    and changed."""
+
+    def __init__(self, previous):
+        self.previous = previous
+        self.state = {}
+        self.keys = {}
+        self.seen = set()
+        self.added = []
+        self.changed = []
+
+    def accept(self, index, node):
+        crc = fingerprint(node)
+        key = entry_key(node) or '#%08x' % crc
+        if key in self.seen:
+            # repeated keys are told apart by position
+            key = '%s#%d' % (key, index)
+        self.keys[index] = key
+        self.seen.add(key)
+        if self.previous.get(key) == crc:
+            self.state[key] = crc
+            return False
+        self.crc = crc
+        return True
+
+    def parsed(self, index, entry):
+        key = self.keys[index]
+        self.state[key] = self.crc
+        if key in self.previous:
+            self.changed.append(entry)
+        else:
+            self.added.append(entry)
+
+
+def parse_delta(document, previous_state=None, **kwargs):
+    """Parse document, skipping the entries that are unchanged since the
+    parse previous_state (a state returned by parse_delta, or None for the
+    first parse) came from.  Returns the result and the new state.  The
+    result's entries are the added and changed entries, in document order;
+    result.added and result.changed hold them separately, and result.removed
+    is a list of the keys of entries that are gone.  An entry that could not
+    be parsed keeps its previous fingerprint.  If the parse was cut short by
+    a limit (see parse), entries that were not looked at keep theirs as well
+    and no removals are reported.  Keyword arguments are passed to parse."""
+    previous = previous_state or {}
+    entry_filter = DeltaFilter(previous)
+    result = sp.parse(document, entry_filter=entry_filter, **kwargs)
+    state, seen = entry_filter.state, entry_filter.seen
+    for key in seen:
+        if key not in state and key in previous:
+            state[key] = previous[key]
+    removed = []
+    if result.bozo or 'limits_exceeded' in result:
+        for key, crc in previous.items():
+            state.setdefault(key, crc)
+    else:
+        removed = sorted(key for key in previous if key not in seen)
+    result['added'] = entry_filter.added
+    result['changed'] = entry_filter.changed
+    result['removed'] = removed
+    return result, state
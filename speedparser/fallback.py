@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Parsing with an automatic fallback to feedparser.  A `FallbackRouter`
+parses documents with speedparser and, when that fails (the result is
+bozo), parses them again with feedparser.  If the document came with a
+`source_key` (a feed url, say), the router remembers that the source needed
+the fallback and sends its next documents straight to feedparser, so a
+problem source costs one speedparser attempt instead of one per parse.
+Every `reprobe_every` parses a remembered source is tried with speedparser
+again, and forgotten if that works.  At most `max_sources` sources are
+remembered;  the least recently seen is forgotten first.
+
+feedparser is only imported the first time it is needed.  `counters` holds
+the number of parses and the time spent in each engine:
+
+    >>> from speedparser.fallback import parse_with_fallback, default_router
+    >>> result = parse_with_fallback(document, source_key=url)
+    >>> default_router.fallback_rate()
+"""
+
+from collections import OrderedDict
+
+from . import speedparser as sp
+
+
+def feedparser_parse(document):
+    import feedparser
+    return feedparser.parse(document)
+
+
+class FallbackRouter(object):
+    """Route documents between speedparser and a fallback parser (by default
+    feedparser.parse), remembering which sources need the fallback."""
+
+    def __init__(self, max_sources=10000, reprobe_every=50, fallback=None):
+        self.max_sources = max_sources
+        self.reprobe_every = reprobe_every
+        self.fallback = fallback or feedparser_parse
+        # source_key -> parses routed to the fallback since the last probe
+        self.sources = OrderedDict()
+        self.counters = {}
+        self.reset()
+
+    def reset(self):
+        """Zero the counters;  remembered sources are kept."""
+        self.counters = dict(speedparser=0, speedparser_time=0.0, feedparser=0,
+            feedparser_time=0.0, fallbacks=0, routed=0, probes=0, recovered=0)
+
+    def remember(self, source_key):
+        self.sources[source_key] = 0
+        while len(self.sources) > self.max_sources:
+            self.sources.popitem(last=False)
+
+    def needs_fallback(self, source_key):
+        return source_key is not None and source_key in self.sources
+
+    def speedparse(self, document, kwargs):
+        t0 = sp.clock()
+        result = sp.parse(document, **kwargs)
+        self.counters['speedparser'] += 1
+        self.counters['speedparser_time'] += sp.clock() - t0
+        return result
+
+    def fallback_parse(self, document):
+        t0 = sp.clock()
+        result = self.fallback(document)
+        self.counters['feedparser'] += 1
+        self.counters['feedparser_time'] += sp.clock() - t0
+        return result
+
+    def parse(self, document, source_key=None, **kwargs):
+        """Parse document with speedparser, or with the fallback parser if
+        speedparser fails on it or has failed on source_key before.  Keyword
+        arguments are passed to speedparser.parse only."""
+        if not isinstance(document, basestring):
+            # both engines may need to read it
+            document = b''.join(sp.iter_decompressed(document))
+        elif sp.compression_type(document[:4]):
+            document = b''.join(sp.iter_decompressed(sp.iter_chunks(document)))
+        if self.needs_fallback(source_key):
+            routed = self.sources.pop(source_key) + 1
+            if routed < self.reprobe_every:
+                self.sources[source_key] = routed
+                self.counters['routed'] += 1
+                return self.fallback_parse(document)
+            self.counters['probes'] += 1
+            result = self.speedparse(document, kwargs)
+            if not result.bozo:
+                self.counters['recovered'] += 1
+                return result
+        else:
+            result = self.speedparse(document, kwargs)
+            if not result.bozo:
+                return result
+        self.counters['fallbacks'] += 1
+        if source_key is not None:
+            self.remember(source_key)
+        return self.fallback_parse(document)
+
+    def fallback_rate(self):
+        """The fraction of parses that ended up being done by the fallback."""
+        c = self.counters
+        total = c['speedparser'] + c['routed']
+        return c['feedparser'] / float(total) if total else 0.0
+
+
+default_router = FallbackRouter()
+
+
+def parse_with_fallback(document, source_key=None, **kwargs):
+    """Parse document with the module's default FallbackRouter."""
+    return default_router.parse(document, source_key=source_key, **kwargs)
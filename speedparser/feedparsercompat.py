@@ -14,6 +14,9 @@ except ImportError:
     from email import _parseaddr as rfc822
 
 
+_missing = object()
+
+
 class FeedParserDict(dict):
     keymap = {'channel': 'feed',
               'items': 'entries',
@@ -30,7 +33,23 @@ class FeedParserDict(dict):
               'copyright_detail': 'rights_detail',
               'tagline': 'subtitle',
               'tagline_detail': 'subtitle_detail'}
-    def __getitem__(self, key):
+
+    # keys with computed values, and for every aliased key the keys that are
+    # tried in order on a read and the key that is used on a write;  these are
+    # derived from keymap once rather than on every access
+    _special = frozenset(['category', 'enclosures', 'license'])
+    _readkeys = {}
+    _writekeys = {}
+    for _key, _realkey in keymap.items():
+        if isinstance(_realkey, list):
+            _readkeys[_key] = tuple(_realkey) + (_key,)
+            _writekeys[_key] = _realkey[0]
+        else:
+            _readkeys[_key] = (_realkey, _key)
+            _writekeys[_key] = _realkey
+    del _key, _realkey
+
+    def _getspecial(self, key):
         if key == 'category':
             try:
                 return dict.__getitem__(self, 'tags')[0]['term']
@@ -39,55 +58,72 @@ class FeedParserDict(dict):
         elif key == 'enclosures':
             norel = lambda link: FeedParserDict([(name,value) for (name,value) in link.items() if name!='rel'])
             return [norel(link) for link in dict.__getitem__(self, 'links') if link['rel']==u'enclosure']
-        elif key == 'license':
-            for link in dict.__getitem__(self, 'links'):
-                if link['rel']==u'license' and 'href' in link:
-                    return link['href']
-        else:
-            realkey = self.keymap.get(key, key)
-            if isinstance(realkey, list):
-                for k in realkey:
-                    if dict.__contains__(self, k):
-                        return dict.__getitem__(self, k)
-            elif dict.__contains__(self, realkey):
-                return dict.__getitem__(self, realkey)
+        for link in dict.__getitem__(self, 'links'):
+            if link['rel']==u'license' and 'href' in link:
+                return link['href']
         return dict.__getitem__(self, key)
 
+    def _lookup(self, key, default):
+        """Return the value for key, or default if it is missing, without
+        raising and catching a KeyError for aliased or plain keys."""
+        if key in self._special:
+            try:
+                return self._getspecial(key)
+            except KeyError:
+                return default
+        readkeys = self._readkeys.get(key, None)
+        if readkeys is None:
+            return dict.get(self, key, default)
+        for k in readkeys:
+            value = dict.get(self, k, _missing)
+            if value is not _missing:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        if key in self._special:
+            return self._getspecial(key)
+        readkeys = self._readkeys.get(key, None)
+        if readkeys is None:
+            return dict.__getitem__(self, key)
+        for k in readkeys:
+            if dict.__contains__(self, k):
+                return dict.__getitem__(self, k)
+        raise KeyError(key)
+
     def __contains__(self, key):
-        try:
-            self.__getitem__(key)
-        except KeyError:
-            return False
-        else:
-            return True
+        if key in self._special:
+            return self._lookup(key, _missing) is not _missing
+        readkeys = self._readkeys.get(key, None)
+        if readkeys is None:
+            return dict.__contains__(self, key)
+        for k in readkeys:
+            if dict.__contains__(self, k):
+                return True
+        return False
 
     has_key = __contains__
 
     def get(self, key, default=None):
-        try:
-            return self.__getitem__(key)
-        except KeyError:
-            return default
+        return self._lookup(key, default)
 
     def __setitem__(self, key, value):
-        key = self.keymap.get(key, key)
-        if isinstance(key, list):
-            key = key[0]
-        return dict.__setitem__(self, key, value)
+        return dict.__setitem__(self, self._writekeys.get(key, key), value)
 
     def setdefault(self, key, value):
-        if key not in self:
+        current = self._lookup(key, _missing)
+        if current is _missing:
             self[key] = value
             return value
-        return self[key]
+        return current
 
     def __getattr__(self, key):
         # __getattribute__() is called first; this will be called
         # only if an attribute was not already found
-        try:
-            return self.__getitem__(key)
-        except KeyError:
+        value = self._lookup(key, _missing)
+        if value is _missing:
             raise AttributeError("object has no attribute '%s'" % key)
+        return value
 
     def __hash__(self):
         return id(self)
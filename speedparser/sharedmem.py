@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shared memory transport for parse results.  A worker process calls
+`parse_to_shared`, which writes the result to a memory backed file (in
+/dev/shm where there is one) and returns a small, picklable SharedHandle;
+the parent passes the handle to `open_result`, which maps the file and
+removes its name at once, so the memory is freed as soon as the result is
+closed (or collected) and nothing is left behind if the parent dies.
+
+The file holds a header, the result without its entries and each entry as a
+separate blob (all in speedparser.serialize's format), and an offset array
+locating the blobs;  a SharedResult only decodes the entries that are read:
+
+    >>> handles = pool.map(parse_to_shared, documents)
+    >>> with open_result(handles[0]) as shared:
+    ...     shared.feed.title, len(shared.entries), shared.entries[0].link
+"""
+
+import os
+import mmap
+import struct
+import tempfile
+from collections import namedtuple
+
+from . import speedparser as sp
+from . import serialize
+
+MAGIC = b'SPM\x01'
+# magic, entry count;  then count + 2 little endian uint64 offsets
+header_format = '<4sI'
+header_size = struct.calcsize(header_format)
+
+shared_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+SharedHandle = namedtuple('SharedHandle', 'path size entries')
+
+
+def write_shared(result, directory=None):
+    """Write a parse result to a new file in directory (by default
+    shared_dir) and return its SharedHandle."""
+    entries = result.get('entries', [])
+    meta = sp.feedparser.FeedParserDict(result)
+    meta.pop('entries', None)
+    blobs = [serialize.dumps(meta)] + [serialize.dumps(e) for e in entries]
+    offsets = [header_size + 8 * (len(blobs) + 1)]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    fd, path = tempfile.mkstemp(prefix='speedparser-', dir=directory or shared_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(struct.pack(header_format, MAGIC, len(entries)))
+            f.write(struct.pack('<%dQ' % len(offsets), *offsets))
+            for blob in blobs:
+                f.write(blob)
+    except Exception:
+        os.unlink(path)
+        raise
+    return SharedHandle(path, offsets[-1], len(entries))
+
+
+def parse_to_shared(document, **kwargs):
+    """Parse a document and write the result to shared memory, returning its
+    SharedHandle.  Use this as the function run by worker processes, like
+    serialize.parse_to_bytes;  keyword arguments are passed to parse."""
+    return write_shared(sp.parse(document, **kwargs))
+
+
+def discard(handle):
+    """Free a result that will not be opened."""
+    try:
+        os.unlink(handle.path)
+    except OSError:
+        pass
+
+
+class SharedEntries(object):
+    """The entries of a SharedResult, decoded as they are read (and kept)."""
+
+    def __init__(self, shared):
+        self.shared = shared
+        self.cache = {}
+
+    def __len__(self):
+        return self.shared.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("entry index out of range")
+        try:
+            return self.cache[index]
+        except KeyError:
+            entry = self.cache[index] = self.shared.blob(index + 1)
+            return entry
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class SharedResult(object):
+    """A parse result in shared memory.  `result` is the result without its
+    entries, `feed` its feed, and `entries` a lazy sequence of its entries;
+    `load` returns the whole result as parse would have.  Close it (or use it
+    as a context manager) to free the memory."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        with open(handle.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), handle.size, access=mmap.ACCESS_READ)
+        # the mapping outlives the name
+        discard(handle)
+        magic, self.count = struct.unpack_from(header_format, self.map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("Not a shared speedparser result.")
+        self.offsets = struct.unpack_from('<%dQ' % (self.count + 2), self.map, header_size)
+        self.result = self.blob(0)
+        self.entries = SharedEntries(self)
+
+    def blob(self, index):
+        return serialize.loads(self.map[self.offsets[index]:self.offsets[index + 1]])
+
+    @property
+    def feed(self):
+        return self.result['feed']
+
+    def load(self):
+        """Return the whole result, with every entry decoded."""
+        result = sp.feedparser.FeedParserDict(self.result)
+        result['entries'] = self.entries[:]
+        return result
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_result(handle):
+    """Open a result written by parse_to_shared;  its file is removed right
+    away, and its memory freed when the SharedResult is closed."""
+    return SharedResult(handle)
@@ -7,7 +7,9 @@ in about 1% of the time feedparser would parse them in.
 LIMITATIONS:
 
  * result.feed.namespaces will only contain namespaces declaed on the
-   root object, not those declared later in the file
+   root object, not those declared later in the file;  elements in
+   namespaces declared later are still recognized if feedparser knows the
+   namespace, by its usual prefix
  * general lack of support for many types of feeds
  * only things verified in test.py are guaranteed to be there;  many fields
    which were not considered important were skipped
@@ -15,22 +17,23 @@ LIMITATIONS:
 """
 
 import re
+import bz2
 import time
+import zlib
+from itertools import chain
 try:
 	import urlparse
 except:
 	import urllib.parse as urlparse
-import chardet
 from lxml import etree
-from lxml.html import clean
 
-try:
-    import feedparser
-except:
-    import feedparsercompat as feedparser
+# the bundled copy of the parts of feedparser speedparser uses;  importing
+# feedparser itself is slow, see use_feedparser
+from . import feedparsercompat
+feedparser = feedparsercompat
 
-keymap = feedparser.FeedParserDict.keymap
-fpnamespaces = feedparser._FeedParserMixin.namespaces
+keymap = feedparsercompat.FeedParserDict.keymap
+fpnamespaces = feedparsercompat._FeedParserMixin.namespaces
 
 xmlns_map = {
     'http://www.w3.org/2005/atom': 'atom10',
@@ -38,7 +41,49 @@ xmlns_map = {
     'http://my.netscape.com/rdf/simple/0.9/': 'rss090',
 }
 
-default_cleaner = clean.Cleaner(
+
+def use_feedparser(use=True):
+    """Build results with feedparser's FeedParserDict and parse dates with its
+    _parse_date, rather than with the copies in feedparsercompat.  This
+    imports feedparser, so it raises ImportError if it is not installed."""
+    global feedparser
+    if use:
+        import feedparser as module
+    else:
+        module = feedparsercompat
+    feedparser = module
+
+
+class LazyCleaner(object):
+    """An lxml.html.clean.Cleaner that is only built (and lxml.html.clean
+    only imported) the first time it is used.  It pickles as its arguments."""
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.cleaner = None
+
+    def get_cleaner(self):
+        if self.cleaner is None:
+            from lxml.html import clean
+            self.cleaner = clean.Cleaner(**self.kwargs)
+        return self.cleaner
+
+    def clean_html(self, html):
+        return self.get_cleaner().clean_html(html)
+
+    def __getattr__(self, name):
+        if name in ('kwargs', 'cleaner') or name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_cleaner(), name)
+
+    def __getstate__(self):
+        return self.kwargs
+
+    def __setstate__(self, kwargs):
+        self.kwargs = kwargs
+        self.cleaner = None
+
+default_cleaner = LazyCleaner(
     comments=True,
     javascript=True,
     scripts=True,
@@ -47,7 +92,7 @@ default_cleaner = clean.Cleaner(
     style=True
 )
 
-simple_cleaner = clean.Cleaner(safe_attrs_only=True, page_structure=True)
+simple_cleaner = LazyCleaner(safe_attrs_only=True, page_structure=True)
 
 
 class FakeCleaner(object):
@@ -60,6 +105,193 @@ class IncompatibleFeedError(Exception):
 
 fake_cleaner = FakeCleaner()
 
+# --- instrumentation ---
+
+clock = getattr(time, 'perf_counter', time.time)
+
+
+class ParseStats(object):
+    """Collects the time spent in, and the number of calls to, each phase of
+    parsing.  Pass one to parse as `stats` and it will record:
+
+     * parse:  the whole parse call (its count is the number of parses)
+     * strip_namespace, parse_xml:  namespace stripping and lxml parsing
+     * parse_encoding, parse_version, parse_namespaces:  feed detection
+     * parse_feed, parse_entries:  feed level and entry level parsing
+     * parse_entry:  each entry
+     * feed.<handler>, entry.<handler>:  each parse_* handler, eg. entry.title
+     * clean, date:  html cleaning and date parsing
+     * bozo:  a count of parses that failed
+
+    Handlers called by other handlers (eg. media content inside links) are
+    counted in both.  A single ParseStats can be passed to many parses to
+    aggregate them;  nothing is recorded, and nothing is wrapped, when parse
+    is not given one.  Times are in seconds from a monotonic clock."""
+
+    def __init__(self):
+        self.timings = {}
+        self.counts = {}
+
+    def add(self, name, seconds, count=1):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+    def count(self, name, count=1):
+        self.add(name, 0.0, count)
+
+    def wrap(self, name, func):
+        """Return func wrapped to record its calls under name."""
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, clock() - t0)
+        return timed
+
+    def instrument(self, obj, names, prefix=''):
+        """Replace the methods `names` on the instance obj with timed versions."""
+        for name in names:
+            label = prefix + (name[6:] if prefix and name.startswith('parse_') else name)
+            setattr(obj, name, self.wrap(label, getattr(obj, name)))
+
+    def merge(self, other):
+        for name, seconds in other.timings.items():
+            self.add(name, seconds, other.counts.get(name, 0))
+
+    def reset(self):
+        self.timings.clear()
+        self.counts.clear()
+
+    def as_dict(self):
+        """Return {phase: {'count': n, 'total': seconds, 'mean': seconds}},
+        for exporting to a metrics system."""
+        d = {}
+        for name, total in self.timings.items():
+            count = self.counts[name]
+            d[name] = {'count': count, 'total': total,
+                'mean': total / count if count else 0.0}
+        return d
+
+    def report(self):
+        """Return the stats as a table, slowest phase first."""
+        lines = ['%-28s %10s %12s %12s' % ('phase', 'count', 'total ms', 'mean us')]
+        rows = sorted(self.as_dict().items(), key=lambda i: -i[1]['total'])
+        for name, d in rows:
+            lines.append('%-28s %10d %12.3f %12.3f' % (name, d['count'],
+                d['total'] * 1000, d['mean'] * 1000000))
+        return '\n'.join(lines)
+
+# --- resource limits ---
+
+
+class ParseLimits(object):
+    """Limits on the work done parsing a feed's entries.  Entries past
+    `max_entries`, entries whose elements nest more than `max_depth` levels
+    deep, and the entries left once `time_budget` seconds have passed since
+    the limits were created are not parsed at all.  Every text and attribute
+    value in the document longer than `max_field_bytes` bytes (as utf-8) is
+    truncated before anything is taken from it, and so is the html of a
+    field, which may be made of many text nodes, before it is cleaned.  What
+    was cut is counted in `exceeded`, keyed by the name of the limit."""
+
+    def __init__(self, max_entries=None, max_field_bytes=None, max_depth=None,
+            time_budget=None):
+        self.max_entries = max_entries
+        self.max_field_bytes = max_field_bytes
+        self.max_depth = max_depth
+        self.deadline = clock() + time_budget if time_budget is not None else None
+        self.too_deep = None
+        self.long_text = None
+        if max_field_bytes is not None:
+            # a character is at most 4 bytes of utf-8, so shorter values fit
+            self.long_text = etree.XPath('//text()[string-length() > $n] | '
+                '//@*[string-length() > $n]')
+        if max_depth is not None:
+            self.too_deep = etree.XPath('boolean(%s)' % '/'.join(['*'] * (max_depth + 1)))
+        self.exceeded = {}
+
+    def exceed(self, name, count=1):
+        self.exceeded[name] = self.exceeded.get(name, 0) + count
+
+    def entries(self, nodes):
+        """Yield (index, node) for the entry nodes that may be parsed."""
+        if self.max_entries is not None and len(nodes) > self.max_entries:
+            self.exceed('max_entries', len(nodes) - self.max_entries)
+            nodes = nodes[:self.max_entries]
+        for index, node in enumerate(nodes):
+            if self.deadline is not None and clock() > self.deadline:
+                self.exceed('time_budget', len(nodes) - index)
+                return
+            if self.too_deep is not None and self.too_deep(node):
+                self.exceed('max_depth')
+                continue
+            yield index, node
+
+    def truncate(self, text):
+        """Truncate text to max_field_bytes bytes of utf-8, dropping a
+        character cut in two."""
+        limit = self.max_field_bytes
+        if limit is None or len(text) * 4 <= limit:
+            return text
+        encoded = text.encode('utf-8') if isinstance(text, unicode) else text
+        if len(encoded) <= limit:
+            return text
+        self.exceed('max_field_bytes')
+        if encoded is text:
+            return text[:limit]
+        return encoded[:limit].decode('utf-8', 'ignore')
+
+    def truncate_tree(self, root):
+        """Truncate the long text and attribute values of a document."""
+        if self.long_text is None:
+            return
+        for text in self.long_text(root, n=self.max_field_bytes // 4):
+            truncated = self.truncate(text)
+            if truncated is text:
+                continue
+            parent = text.getparent()
+            if text.is_attribute:
+                parent.set(text.attrname, truncated)
+            elif text.is_tail:
+                parent.tail = truncated
+            else:
+                parent.text = truncated
+
+
+# --- parallel cleaning ---
+
+clean_chunk_size = 16
+
+
+class DeferredClean(object):
+    """Stands in for the cleaned version of a text while the entries of a
+    feed are parsed;  `index` is the text's position in the list of texts
+    to clean, `strip` says whether its outer tag is to be stripped, and
+    `field` is the field whose handler asked for it to be cleaned."""
+    __slots__ = ('index', 'strip', 'field')
+
+    def __init__(self, index, strip, field):
+        self.index = index
+        self.strip = strip
+        self.field = field
+
+
+def clean_texts(args):
+    """Clean a chunk of texts with a cleaner, given as (cleaner, texts).
+    Returns a (value, error) pair per text, where error is None or the
+    (type name, message) of the exception cleaning it raised.  It is a
+    module level function so process pools can pickle it."""
+    cleaner, texts = args
+    results = []
+    for text in texts:
+        try:
+            results.append((cleaner.clean_html(text), None))
+        except Exception as e:
+            results.append((None, (type(e).__name__, '%s' % (e,))))
+    return results
+
+
 # --- text utilities ---
 
 
@@ -106,11 +338,16 @@ def strip_outer_tag(text):
 nsre = re.compile(r'xmlns\s*=\s*[\'"](.+?)[\'"]')
 
 
+def declares_namespace(head):
+    """Return True if the head of a document looks like it declares a
+    default namespace that strip_namespace should remove."""
+    if head[:1000].count('xmlns') > 5:
+        return True
+    return 'xmlns' in head[:400]
+
+
 def strip_namespace(document):
-    if document[:1000].count('xmlns') > 5:
-        if 'xmlns' not in document[:1000]:
-            return None, document
-    elif 'xmlns' not in document[:400]:
+    if not declares_namespace(document):
         return None, document
     match = nsre.search(document)
     if match:
@@ -118,35 +355,298 @@ def strip_namespace(document):
     return None, document
 
 
+class NamespaceStripper(object):
+    """A streaming version of strip_namespace.  Iterating over it yields the
+    chunks of a document with the default namespace declarations removed;
+    once iteration has finished, the stripped namespace is in `xmlns`.  A tag
+    left open at the end of a chunk is held back until it closes, so a tag
+    split across two chunks is always stripped as a whole;  text outside
+    tags is passed on as it comes."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.xmlns = None
+
+    def __iter__(self):
+        chunks = iter(self.chunks)
+        head = b''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= 1000:
+                break
+        if not declares_namespace(head):
+            if head:
+                yield head
+            for chunk in chunks:
+                yield chunk
+            return
+        # the chunks held back, which start with an open tag if in_tag is set
+        pending, in_tag = [], False
+        for chunk in chain([head], chunks):
+            start, end = chunk.rfind(b'<'), chunk.rfind(b'>')
+            if end > start:
+                cut = end + 1
+            elif start != -1:
+                cut = start
+            elif not in_tag:
+                cut = len(chunk)
+            else:
+                pending.append(chunk)
+                continue
+            pending.append(chunk[:cut])
+            ready = b''.join(pending)
+            if ready:
+                yield self.strip(ready)
+            pending, in_tag = [chunk[cut:]], cut == start
+        ready = b''.join(pending)
+        if ready:
+            yield self.strip(ready)
+
+    def strip(self, text):
+        if self.xmlns is None:
+            match = nsre.search(text)
+            if match:
+                self.xmlns = match.groups()[0]
+        return nsre.sub('', text)
+
+# --- compressed input ---
+
+chunk_size = 64 * 1024
+
+
+def compression_type(head):
+    """Return 'gzip', 'bz2' or 'deflate' if the head of a document starts with
+    the magic bytes of that compression format, otherwise None."""
+    if not isinstance(head, bytes) or len(head) < 2:
+        return None
+    if head[:2] == b'\x1f\x8b':
+        return 'gzip'
+    if head[:3] == b'BZh':
+        return 'bz2'
+    # a zlib stream starts with a CMF/FLG pair whose value is a multiple of 31
+    if head[:1] == b'\x78' and (ord(head[0:1]) * 256 + ord(head[1:2])) % 31 == 0:
+        return 'deflate'
+    return None
+
+
+def decompressor(kind):
+    if kind == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if kind == 'deflate':
+        return zlib.decompressobj()
+    if kind == 'bz2':
+        return bz2.BZ2Decompressor()
+    raise ValueError("Unknown compression type %r" % kind)
+
+
+def iter_chunks(document, size=chunk_size):
+    """Yield a string in chunks of `size` bytes."""
+    for offset in range(0, len(document), size):
+        yield document[offset:offset+size]
+
+
+def iter_decompressed(chunks):
+    """Given an iterable of raw chunks, yield the chunks decompressed if the
+    stream starts with gzip, zlib or bz2 magic bytes, or unchanged if not.
+    gzip and zlib streams are decompressed at most chunk_size bytes at a
+    time, so a small input that expands enormously (a decompression bomb) is
+    never held in memory at once.  python 2's BZ2Decompressor can't bound
+    its output, so a bz2 chunk is decompressed whole."""
+    chunks = iter(chunks)
+    for first in chunks:
+        if first:
+            break
+    else:
+        return
+    kind = compression_type(first)
+    if kind is None:
+        yield first
+        for chunk in chunks:
+            yield chunk
+        return
+    d = decompressor(kind)
+    if kind == 'bz2':
+        for chunk in chain([first], chunks):
+            data = d.decompress(chunk)
+            if data:
+                yield data
+        return
+    for chunk in chain([first], chunks):
+        while chunk:
+            data = d.decompress(chunk, chunk_size)
+            if data:
+                yield data
+            chunk = d.unconsumed_tail
+    data = d.flush()
+    if data:
+        yield data
+
+
+# --- format classification ---
+
+supported_versions = frozenset(['rss20', 'rss092', 'rss091', 'rss', 'rss090', 'rss10',
+    'atom10', 'atom03'])
+version_map = {
+    'rss2': 'rss20',
+}
+
+
+def feed_version(root_tag, xmlns, version_attr):
+    """Return the feed version for a root tag (without namespace), the
+    default namespace stripped from the document and the root's version
+    attribute.  Versions that could not be worked out contain 'unk'."""
+    root_tag = root_tag.lower()
+    vers = 'unk'
+    if xmlns and xmlns.lower() in xmlns_map:
+        value = xmlns_map[xmlns.lower()]
+        if value == 'rss10' and root_tag == 'rss':
+            value = 'rss010'
+        if not (value.startswith('atom') and root_tag == 'rss'):
+            return value
+    elif xmlns:
+        vers = xmlns.split('/')[-2].replace('.', '')
+    tag = root_tag
+    if version_attr:
+        vers = version_attr.replace('.', '')
+    if root_tag in ('rss', 'rdf'):
+        tag = 'rss'
+    if root_tag in ('feed'):
+        tag = 'atom'
+    if root_tag == 'rss' and vers == '10' and root_tag == 'rss':
+        vers = ''
+    return '%s%s' % (tag, vers)
+
+rootre = re.compile(r'<([^\s/>!?]+)([^>]*)>')
+attrre = re.compile(r'([^\s=]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def find_root(head, pos=0):
+    """Find the root element in the head of a document, skipping the xml
+    declaration, processing instructions, comments and doctype.  Returns
+    (tag, attribute string) and the position the root starts at, or None and
+    the position to resume from once more of the head has been read."""
+    pos = head.find('<', pos)
+    while pos != -1:
+        if head.startswith('<?', pos):
+            end = head.find('?>', pos)
+        elif head.startswith('<!--', pos):
+            end = head.find('-->', pos)
+        elif head.startswith('<!', pos):
+            end = head.find('>', pos)
+            subset = head.find('[', pos, end)
+            if subset != -1:
+                end = head.find(']', subset)
+                end = head.find('>', end) if end != -1 else -1
+        else:
+            match = rootre.match(head, pos)
+            return (match.groups() if match else None), pos
+        if end == -1:
+            return None, pos
+        pos = head.find('<', end)
+    return None, len(head)
+
+classify_head_size = 64 * 1024
+
+
+def iter_head(document, size=4096, limit=classify_head_size):
+    """Yield growing heads of a (possibly compressed) document string, up
+    to about limit bytes."""
+    head = document[:0]
+    for chunk in iter_decompressed(iter_chunks(document, size)):
+        if len(head) >= limit:
+            return
+        head += chunk
+        if isinstance(head, bytes) and head[:2] in (b'\xff\xfe', b'\xfe\xff'):
+            yield head[:len(head) & ~1].decode('utf-16', 'replace').encode('utf-8')
+        else:
+            yield head
+
+
+def classify(document):
+    """Work out the version of a feed ('rss20', 'rss10', 'atom10', ...) from
+    the head of the document alone, without parsing it:  the root tag, its
+    version attribute and the default namespace decide it just as they do
+    for a full parse.  Returns 'unsupported' for documents speedparser
+    cannot parse, and for documents whose root element does not start in
+    their first classify_head_size bytes.  Compressed documents are
+    decompressed only as far as the root element.  The result can be passed
+    to parse as `version`."""
+    pos = 0
+    for head in iter_head(document):
+        root, pos = find_root(head, pos)
+        if root is not None:
+            break
+    else:
+        return 'unsupported'
+    tag, attribs = root
+    version, xmlns = None, None
+    for name, double, single in attrre.findall(attribs):
+        if name == 'version':
+            version = double or single
+    if declares_namespace(head):
+        match = nsre.search(head)
+        if match:
+            xmlns = match.groups()[0].strip('#')
+    version = feed_version(tag.split(':')[-1], xmlns, version)
+    version = version_map.get(version, version)
+    return version if version in supported_versions else 'unsupported'
+
+
+# feedparser's email pattern, with a lookbehind so that a match can only start
+# at the beginning of a run of local part characters;  without it, a failed
+# match is retried from every position in the run, which is quadratic
+email_re = re.compile(r"(?<![a-zA-Z0-9\_\-\.\+])(([a-zA-Z0-9\_\-\.\+]+)@((\[[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.)|(([a-zA-Z0-9\-]+\.)+))([a-zA-Z]{2,4}|[0-9]{1,3})(\]?))(\?subject=\S+)?", re.UNICODE)
+
+
+def find_email(author):
+    """Return the first email address in author, or None.  This finds the
+    same address as searching for feedparser's pattern, in linear time."""
+    match = email_re.search(author)
+    return match.group(0) if match else None
+
+
 def munge_author(author):
     """If an author contains an email and a name in it, make sure it is in
     the format: "name (email)"."""
     # this loveliness is from feedparser but was not usable as a function
-    if '@' in author:
-        emailmatch = re.search(r"(([a-zA-Z0-9\_\-\.\+]+)@((\[[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.)|(([a-zA-Z0-9\-]+\.)+))([a-zA-Z]{2,4}|[0-9]{1,3})(\]?))(\?subject=\S+)?", author, re.UNICODE)
-        if emailmatch:
-            email = emailmatch.group(0)
-            # probably a better way to do the following, but it passes all the tests
-            author = author.replace(email, u'')
-            author = author.replace(u'()', u'')
-            author = author.replace(u'<>', u'')
-            author = author.replace(u'&lt;&gt;', u'')
-            author = author.strip()
-            if author and (author[0] == u'('):
-                author = author[1:]
-            if author and (author[-1] == u')'):
-                author = author[:-1]
-            author = author.strip()
-            return '%s (%s)' % (author, email)
+    if '@' not in author:
+        return author
+    email = find_email(author)
+    if email:
+        # probably a better way to do the following, but it passes all the tests
+        author = author.replace(email, u'')
+        author = author.replace(u'()', u'')
+        author = author.replace(u'<>', u'')
+        author = author.replace(u'&lt;&gt;', u'')
+        author = author.strip()
+        if author and (author[0] == u'('):
+            author = author[1:]
+        if author and (author[-1] == u')'):
+            author = author[:-1]
+        author = author.strip()
+        return '%s (%s)' % (author, email)
     return author
 
 # --- common xml utilities ---
 
 
+# feedparser's prefixes for the namespaces it knows, by lowercased uri
+canonical_namespaces = dict((uri.lower(), prefix) for uri, prefix in fpnamespaces.items())
+
+
+class NamespaceLookup(dict):
+    """Maps namespace uris to prefixes.  It starts out with the namespaces
+    declared on the document root;  any other uri, wherever it was declared,
+    is looked up (case-insensitively) among the namespaces feedparser knows,
+    and is its own prefix if it is not one of them.  Lookups are cached."""
+
+    def __missing__(self, uri):
+        prefix = self[uri] = canonical_namespaces.get(uri.lower(), uri)
+        return prefix
+
+
 def reverse_namespace_map(nsmap):
-    d = fpnamespaces.copy()
-    d.update(dict([(v, k) for (k, v) in nsmap.iteritems()]))
-    return d
+    return NamespaceLookup((v, k) for (k, v) in nsmap.iteritems())
 
 
 def base_url(root):
@@ -171,6 +671,59 @@ def full_href_attribs(attribs, base=None):
     return d
 
 
+# characters that make urljoin rewrite an absolute url rather than return it
+# as it is (it drops an empty query, fragment or params, rejects brackets
+# outside an ipv6 host and strips some whitespace);  urls with any of them
+# are always resolved with urljoin
+url_rewrite_chars = '?#;[] \t\r\n'
+
+
+def is_plain_absolute(href):
+    """True for an absolute http(s) url that urljoin would return unchanged
+    whatever the base url."""
+    if href.startswith('http://'):
+        netloc = 7
+    elif href.startswith('https://'):
+        netloc = 8
+    else:
+        return False
+    if len(href) == netloc or href[netloc] == '/':
+        return False
+    for char in url_rewrite_chars:
+        if char in href:
+            return False
+    return True
+
+
+class UrlResolver(object):
+    """Resolves urls against a feed's base url, giving the same results as
+    full_href.  Absolute urls are recognized with a prefix check and returned
+    as they are, and the urljoin of each relative url is memoized, so feeds
+    with many links per entry do not pay for a urljoin per url."""
+
+    def __init__(self, base=None):
+        self.base = base
+        self.cache = {}
+
+    def resolve(self, href):
+        if not self.base or is_plain_absolute(href):
+            return href
+        # keyed by type as well, as urljoin's result is str or unicode like href
+        key = (type(href), href)
+        try:
+            return self.cache[key]
+        except KeyError:
+            url = self.cache[key] = urlparse.urljoin(self.base, href)
+            return url
+
+    def resolve_attribs(self, attribs):
+        """Return a dict of attribs with the href resolved."""
+        d = dict(attribs)
+        if self.base and 'href' in d:
+            d['href'] = self.resolve(d['href'])
+        return d
+
+
 def clean_ns(tag):
     """Return a tag and its namespace separately."""
     if '}' in tag:
@@ -186,14 +739,154 @@ def xpath(node, query, namespaces={}):
     return node.xpath(query)
 
 
+def innertext_children(node):
+    """The markup of a node's children, tails included, as one tostring of
+    the node would give it:  any namespace declarations the node's ancestors
+    make are not repeated on each child.  Returns None if the node declares
+    namespaces of its own, which the children would lose, or if the
+    serialization does not look as expected."""
+    parent = node.getparent()
+    if node.nsmap != (parent.nsmap if parent is not None else {}):
+        return None
+    markup = etree.tostring(node, with_tail=False)
+    # attribute values and text are escaped, so the first '>' ends the start
+    # tag and the first '<' after it starts the first child
+    start = markup.find(b'<', markup.find(b'>') + 1)
+    end = markup.rfind(b'</')
+    if start == -1 or end < start:
+        return None
+    return markup[start:end]
+
+
 def innertext(node):
     """Return the inner text of a node.  If a node has no sub elements, this
     is just node.text.  Otherwise, it's node.text + sub-element-text +
     node.tail."""
     if not len(node):
         return node.text
+    children = innertext_children(node)
+    if children is None:
+        children = ''.join([etree.tostring(c) for c in node])
+    return (node.text or '') + children + (node.tail or '')
+
+
+# --- compact entries ---
+
+
+class CompactEntry(object):
+    """A slotted alternative to FeedParserDict for entries, used when parse is
+    called with result_type='compact'.  Each field the entry parsers produce
+    is a slot;  fields missing from the entry are left unset, so attribute
+    access on them raises AttributeError just like it does on FeedParserDict.
+    The subset of the dict interface that the entry parsers use is supported,
+    including feedparser's key aliases (eg. 'guid' for 'id').  Use
+    to_feedparser to get an equivalent FeedParserDict."""
+
+    __slots__ = ('title', 'link', 'links', 'id', 'author', 'comments',
+        'updated', 'updated_parsed', 'content', 'summary', 'media_content',
+        'media_thumbnail')
+
+    fields = frozenset(__slots__)
+    aliases = {'description': 'summary'}
+    for _key, _value in keymap.items():
+        if isinstance(_value, basestring) and _value in fields:
+            aliases[_key] = _value
+    del _key, _value
+
+    def __init__(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def _field(self, key):
+        key = self.aliases.get(key, key)
+        if key not in self.fields:
+            raise KeyError(key)
+        return key
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self._field(key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        setattr(self, self._field(key), value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, self._field(key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        key = self.aliases.get(key, key)
+        return key in self.fields and hasattr(self, key)
+
+    has_key = __contains__
+
+    def __getattr__(self, key):
+        # only called for unset slots and unknown names
+        if key in self.aliases:
+            return getattr(self, self.aliases[key])
+        raise AttributeError("object has no attribute '%s'" % key)
+
+    def get(self, key, default=None):
+        key = self.aliases.get(key, key)
+        if key not in self.fields:
+            return default
+        return getattr(self, key, default)
+
+    def setdefault(self, key, value):
+        key = self._field(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            setattr(self, key, value)
+            return value
+
+    def keys(self):
+        return [k for k in self.__slots__ if hasattr(self, k)]
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
 
-    return (node.text or '') + ''.join([etree.tostring(c) for c in node]) + (node.tail or '')
+    def __eq__(self, other):
+        if isinstance(other, CompactEntry):
+            return self.items() == other.items()
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = object.__hash__
+
+    def __getstate__(self):
+        return dict(self.items())
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return 'CompactEntry(%r)' % dict(self.items())
+
+    @property
+    def enclosures(self):
+        return [dict((k, v) for k, v in link.items() if k != 'rel')
+            for link in self.get('links', []) if link.get('rel') == 'enclosure']
+
+    def to_feedparser(self):
+        """Return this entry as a FeedParserDict."""
+        return feedparser.FeedParserDict(self.items())
 
 
 class SpeedParserEntriesRss20(object):
@@ -229,53 +922,188 @@ class SpeedParserEntriesRss20(object):
     }
 
     def __init__(self, root, namespaces={}, version='rss20', encoding='utf-8', feed={},
-            cleaner=default_cleaner, unix_timestamp=False):
+            cleaner=default_cleaner, unix_timestamp=False, entry_class=None, stats=None,
+            limits=None, nslookup=None, clean_pool=None, clean_threshold=0, entry_filter=None):
+        if stats is not None:
+            self.instrument(stats)
+        self.stats = stats
+        self.limits = limits
         self.encoding = encoding
+        self.entry_class = entry_class or feedparser.FeedParserDict
         self.namespaces = namespaces
         self.unix_timestamp = unix_timestamp
-        self.nslookup = reverse_namespace_map(namespaces)
+        self.nslookup = nslookup if nslookup is not None else reverse_namespace_map(namespaces)
         self.cleaner = cleaner
         self.entry_objects = xpath(root, self.entry_xpath, namespaces)
         self.feed = feed
         self.baseurl = base_url(root)
         if not self.baseurl and 'link' in self.feed:
             self.baseurl = self.feed.link
+        self.urls = UrlResolver(self.baseurl)
         entries = []
-        for obj in self.entry_objects:
-            d = self.parse_entry(obj)
+        self.errors = []
+        # with a pool, texts are cleaned after all the entries are parsed
+        self.deferred = None
+        self.field = None
+        if clean_pool is not None and len(self.entry_objects) > clean_threshold and \
+                not isinstance(cleaner, FakeCleaner):
+            self.deferred = {}
+            indexes = []
+        if limits is not None:
+            objects = limits.entries(self.entry_objects)
+        else:
+            objects = enumerate(self.entry_objects)
+        for index, obj in objects:
+            if entry_filter is not None and not entry_filter.accept(index, obj):
+                continue
+            self.index = index
+            try:
+                d = self.parse_entry(obj)
+            except Exception as e:
+                # a broken entry is left out rather than failing the feed
+                self.entry_error(obj, e)
+                continue
             if d:
                 entries.append(d)
+                if entry_filter is not None:
+                    entry_filter.parsed(index, d)
+                if self.deferred is not None:
+                    indexes.append((index, obj))
+        if self.deferred:
+            self.clean_deferred(clean_pool, entries, indexes)
         self.entries = entries
 
-    def clean(self, text):
+    def instrument(self, stats):
+        handlers = set('parse_%s' % m for m in self.tag_map.values())
+        handlers.update(['parse_media_content', 'parse_media_thumbnail'])
+        stats.instrument(self, sorted(handlers), 'entry.')
+        stats.instrument(self, ['parse_entry'])
+        self.clean = stats.wrap('clean', self.clean)
+        self.parse_date_value = stats.wrap('date', self.parse_date_value)
+
+    def clean(self, text, strip=False):
+        """Clean text, stripping the outer tag of the result if strip is
+        True.  While cleaning is deferred, a DeferredClean is returned."""
         if text and isinstance(text, basestring):
+            if self.limits is not None:
+                text = self.limits.truncate(text)
+            if self.deferred is not None:
+                index = self.deferred.setdefault(text, len(self.deferred))
+                return DeferredClean(index, strip, self.field)
+            if strip:
+                return strip_outer_tag(self.cleaner.clean_html(text))
             return self.cleaner.clean_html(text)
         return text
 
+    def clean_deferred(self, pool, entries, indexes):
+        """Clean the distinct texts whose cleaning was deferred in chunks on
+        pool, and put the results in place of the DeferredClean markers in
+        entries.  A field whose text could not be cleaned is removed, along
+        with the copies of it parse_entry made."""
+        t0 = clock()
+        texts = [None] * len(self.deferred)
+        for text, index in self.deferred.items():
+            texts[index] = text
+        self.deferred = None
+        chunks = [(self.cleaner, texts[i:i + clean_chunk_size])
+            for i in range(0, len(texts), clean_chunk_size)]
+        cleaned = list(chain.from_iterable(pool.map(clean_texts, chunks)))
+        if self.stats is not None:
+            self.stats.add('clean', clock() - t0, len(texts))
+
+        def resolve(marker):
+            value, error = cleaned[marker.index]
+            if error is None and marker.strip:
+                value = strip_outer_tag(value)
+            return value, error
+
+        for (index, node), e in zip(indexes, entries):
+            # the same marker is in both summary and content when one was copied
+            failed = {}
+            for key in ('title', 'comments', 'summary'):
+                marker = e.get(key, None)
+                if isinstance(marker, DeferredClean):
+                    value, error = resolve(marker)
+                    if error is None:
+                        e[key] = value or ''
+                    else:
+                        del e[key]
+                        failed[id(marker)] = (marker.field, error)
+            content = e.get('content', None)
+            if content:
+                for item in list(content):
+                    marker = item['value']
+                    if isinstance(marker, DeferredClean):
+                        value, error = resolve(marker)
+                        if error is None:
+                            item['value'] = value or ''
+                        else:
+                            content.remove(item)
+                            failed[id(marker)] = (marker.field, error)
+                if not content:
+                    del e['content']
+            if failed:
+                self.fill_summary(e)
+            for field, (name, message) in sorted(failed.values()):
+                self.errors.append({'entry': index, 'field': field, 'tag': node.tag,
+                    'line': node.sourceline, 'type': name, 'message': message})
+
+    def entry_error(self, node, e, field=None):
+        """Record an exception raised while parsing the current entry (or,
+        if field is given, one of its fields) in self.errors."""
+        self.errors.append({
+            'entry': self.index,
+            'field': field,
+            'tag': node.tag if isinstance(node.tag, basestring) else None,
+            'line': node.sourceline,
+            'type': type(e).__name__,
+            'message': '%s' % (e,),
+        })
+
+    def parse_date_value(self, value):
+        return feedparser._parse_date(value)
+
     def parse_entry(self, entry):
         """An attempt to parse pieces of an entry out w/o xpath, by looping
         over the entry root's children and slotting them into the right places.
         This is going to be way messier than SpeedParserEntries, and maybe
         less cleanly usable, but it should be faster."""
 
-        e = feedparser.FeedParserDict()
+        e = self.entry_class()
         tag_map = self.tag_map
         nslookup = self.nslookup
 
         for child in entry.getchildren():
-            if isinstance(child, etree._Comment):
+            if not isinstance(child.tag, basestring):
+                # comments, processing instructions and entities
                 continue
             ns, tag = clean_ns(child.tag)
             mapping = tag_map.get(tag, None)
-            if mapping:
-                getattr(self, 'parse_%s' % mapping)(child, e, nslookup.get(ns, ns))
-            if not ns:
-                continue
-            fulltag = '%s:%s' % (nslookup.get(ns, ''), tag)
-            mapping = tag_map.get(fulltag, None)
-            if mapping:
-                getattr(self, 'parse_%s' % mapping)(child, e, nslookup[ns])
+            try:
+                if mapping:
+                    self.field = mapping
+                    getattr(self, 'parse_%s' % mapping)(child, e, nslookup[ns])
+                if not ns:
+                    continue
+                fulltag = '%s:%s' % (nslookup[ns], tag)
+                mapping = tag_map.get(fulltag, None)
+                if mapping:
+                    self.field = mapping
+                    getattr(self, 'parse_%s' % mapping)(child, e, nslookup[ns])
+            except Exception as ex:
+                # the other fields of the entry are still good
+                self.entry_error(child, ex, mapping)
+
+        self.fill_summary(e)
 
+        # support feed entries that have a guid but no link
+        if 'guid' in e and 'link' not in e:
+            e['link'] = self.urls.resolve(e['guid'])
+
+        return e
+
+    def fill_summary(self, e):
+        """Copy summary and content into each other where one is missing."""
         lacks_summary = 'summary' not in e or e['summary'] is None
         lacks_content = 'content' not in e or not bool(e.get('content', None))
 
@@ -291,16 +1119,10 @@ class SpeedParserEntriesRss20(object):
         if e.get('summary', False) is None:
             e['summary'] = u''
 
-        # support feed entries that have a guid but no link
-        if 'guid' in e and 'link' not in e:
-            e['link'] = full_href(e['guid'], self.baseurl)
-
-        return e
-
     def parse_date(self, node, entry, ns=''):
         value = unicoder(node.text)
         entry['updated'] = value
-        date = feedparser._parse_date(value)
+        date = self.parse_date_value(value)
         if self.unix_timestamp and date:
             date = time.mktime(date)
         entry['updated_parsed'] = date
@@ -310,7 +1132,7 @@ class SpeedParserEntriesRss20(object):
             return
         title = unicoder(node.text)
         if title is not None:
-            title = strip_outer_tag(self.clean(title.strip()))
+            title = self.clean(title.strip(), strip=True)
         entry['title'] = title or ''
 
     def parse_author(self, node, entry, ns=''):
@@ -346,26 +1168,15 @@ class SpeedParserEntriesRss20(object):
     def parse_links(self, node, entry, ns=''):
 
         if unicoder(node.text):
-            entry['link'] = full_href(
-                unicoder(node.text).strip('#'),
-                self.baseurl
-            )
+            entry['link'] = self.urls.resolve(unicoder(node.text).strip('#'))
 
         if 'link' not in entry and node.attrib.get('rel', '') == 'alternate' and 'href' in node.attrib:
-            entry['link'] = full_href(
-                unicoder(node.attrib['href']).strip('#'),
-                self.baseurl
-            )
+            entry['link'] = self.urls.resolve(unicoder(node.attrib['href']).strip('#'))
         if 'link' not in entry and 'rel' not in node.attrib and 'href' in node.attrib:
-            entry['link'] = full_href(
-                unicoder(node.attrib['href']).strip('#'),
-                self.baseurl
-            )
+            entry['link'] = self.urls.resolve(unicoder(node.attrib['href']).strip('#'))
 
         if node.attrib:
-            entry.setdefault('links', []).append(
-                full_href_attribs(node.attrib, self.baseurl)
-            )
+            entry.setdefault('links', []).append(self.urls.resolve_attribs(node.attrib))
 
         # media can be embedded within links..
         for child in node:
@@ -376,7 +1187,7 @@ class SpeedParserEntriesRss20(object):
     def parse_comments(self, node, entry, ns=''):
         if 'comments' in entry and ns:
             return
-        entry['comments'] = strip_outer_tag(self.clean(unicoder(node.text)))
+        entry['comments'] = self.clean(unicoder(node.text), strip=True)
 
     def parse_content(self, node, entry, ns=''):
         # media:content is processed as media_content below
@@ -459,15 +1270,19 @@ class SpeedParserFeedRss20(object):
     }
 
     def __init__(self, root, namespaces={}, encoding='utf-8', type='rss20', cleaner=default_cleaner,
-            unix_timestamp=False):
+            unix_timestamp=False, stats=None, nslookup=None):
         """A port of SpeedParserFeed that uses far fewer xpath lookups, which
         ends up simplifying parsing and makes it easier to catch the various
         names that different tags might come under."""
+        if stats is not None:
+            self.instrument(stats)
         self.root = root
         self.unix_timestamp = unix_timestamp
-        nslookup = reverse_namespace_map(namespaces)
+        if nslookup is None:
+            nslookup = reverse_namespace_map(namespaces)
         self.cleaner = cleaner
         self.baseurl = base_url(root)
+        self.urls = UrlResolver(self.baseurl)
 
         feed = feedparser.FeedParserDict()
         tag_map = self.tag_map
@@ -477,15 +1292,16 @@ class SpeedParserFeedRss20(object):
             channel = channel[0]
 
         for child in channel:
-            if isinstance(child, etree._Comment):
+            if not isinstance(child.tag, basestring):
+                # comments, processing instructions and entities
                 continue
             ns, tag = clean_ns(child.tag)
             mapping = tag_map.get(tag, None)
             if mapping:
-                getattr(self, 'parse_%s' % mapping)(child, feed, nslookup.get(ns, ns))
+                getattr(self, 'parse_%s' % mapping)(child, feed, nslookup[ns])
             if not ns:
                 continue
-            fulltag = '%s:%s' % (nslookup.get(ns, ''), tag)
+            fulltag = '%s:%s' % (nslookup[ns], tag)
             mapping = tag_map.get(fulltag, None)
             if mapping:
                 getattr(self, 'parse_%s' % mapping)(child, feed, nslookup[ns])
@@ -503,6 +1319,12 @@ class SpeedParserFeedRss20(object):
 
         self.feed = feed
 
+    def instrument(self, stats):
+        handlers = set('parse_%s' % m for m in self.tag_map.values())
+        stats.instrument(self, sorted(handlers), 'feed.')
+        self.clean = stats.wrap('clean', self.clean)
+        self.parse_date_value = stats.wrap('date', self.parse_date_value)
+
     def clean(self, text, outer_tag=True):
         if text and isinstance(text, basestring):
             if not outer_tag:
@@ -511,6 +1333,9 @@ class SpeedParserFeedRss20(object):
             return self.cleaner.clean_html(text)
         return text
 
+    def parse_date_value(self, value):
+        return feedparser._parse_date(value)
+
     def parse_title(self, node, feed, ns=''):
         feed['title'] = strip_outer_tag(self.clean(unicoder(node.text))) or ''
 
@@ -522,17 +1347,17 @@ class SpeedParserFeedRss20(object):
 
     def parse_links(self, node, feed, ns=''):
         if node.text:
-            feed['link'] = full_href(unicoder(node.text).strip('#'), self.baseurl)
+            feed['link'] = self.urls.resolve(unicoder(node.text).strip('#'))
         if 'link' not in feed and node.attrib.get('rel', '') == 'alternate' and 'href' in node.attrib:
-            feed['link'] = full_href(unicoder(node.attrib['href']).strip('#'), self.baseurl)
+            feed['link'] = self.urls.resolve(unicoder(node.attrib['href']).strip('#'))
         if 'link' not in feed and 'rel' not in node.attrib and 'href' in node.attrib:
-            feed['link'] = full_href(unicoder(node.attrib['href']).strip('#'), self.baseurl)
-        feed.setdefault('links', []).append(full_href_attribs(node.attrib, self.baseurl))
+            feed['link'] = self.urls.resolve(unicoder(node.attrib['href']).strip('#'))
+        feed.setdefault('links', []).append(self.urls.resolve_attribs(node.attrib))
 
     def parse_date(self, node, feed, ns=''):
         value = unicoder(node.text)
         feed['updated'] = value
-        date = feedparser._parse_date(value)
+        date = self.parse_date_value(value)
         if self.unix_timestamp and date:
             date = time.mktime(date)
         feed['updated_parsed'] = date
@@ -564,20 +1389,77 @@ class SpeedParserFeedRdf(SpeedParserFeedRss20):
     channel_xpath = '/rdf:RDF/channel'
 
 
-class SpeedParser(object):
+class SourceProfile(object):
+    """What parsing a source's documents finds out about the source before it
+    gets to the feed itself:  its version, namespaces, namespace lookup and
+    the classes that parse it.  Pass the same profile to parse for every
+    document from a source;  these are then worked out once, and only again
+    when a document's fingerprint (root tag, version attribute, stripped
+    default namespace, namespace declarations of the root and declared
+    encoding) differs from the last one's.  `hits` and `misses` count the
+    parses that could and could not use the profile."""
+
+    def __init__(self):
+        self.fingerprint = None
+        self.version = None
+        self.namespaces = None
+        self.nslookup = None
+        self.classes = None
+        self.hits = 0
+        self.misses = 0
+
+    def store(self, parser, fingerprint):
+        self.fingerprint = fingerprint
+        self.version = parser.version
+        self.namespaces = parser.namespaces
+        self.nslookup = parser.nslookup
+        self.classes = parser.classes
 
-    version_map = {
-        'rss2': 'rss20',
-    }
 
-    def __init__(self, content, cleaner=default_cleaner, unix_timestamp=False, encoding=None):
+class SpeedParser(object):
+
+    version_map = version_map
+
+    dispatch = {}
+    for _version in ('rss20', 'rss092', 'rss091', 'rss'):
+        dispatch[_version] = (SpeedParserFeedRss20, SpeedParserEntriesRss20)
+    for _version in ('rss090', 'rss10'):
+        dispatch[_version] = (SpeedParserFeedRdf, SpeedParserEntriesRdf)
+    for _version in ('atom10', 'atom03'):
+        dispatch[_version] = (SpeedParserFeedAtom, SpeedParserEntriesAtom)
+    del _version
+
+    instrumented = ['strip_namespace', 'parse_xml', 'parse_encoding', 'parse_version',
+        'parse_namespaces', 'parse_feed', 'parse_entries']
+
+    strip_namespace = staticmethod(strip_namespace)
+
+    def __init__(self, content, cleaner=default_cleaner, unix_timestamp=False, encoding=None,
+            entry_class=None, stats=None, version=None, limits=None, profile=None,
+            clean_pool=None, clean_threshold=0, entry_filter=None):
+        """Parse `content`, which is either a document string or an iterable
+        of string chunks;  chunks are fed to lxml incrementally.  If version
+        is given (see classify), it is used instead of detecting it.  If a
+        SourceProfile is given, what it holds is used when it matches the
+        document, and it is updated when it does not.  If clean_pool is given,
+        the html of feeds with more than clean_threshold entries is cleaned on
+        it.  entry_filter is described in parse."""
+        if version == 'unsupported':
+            raise IncompatibleFeedError("Feed not compatible with speedparser.")
         self.cleaner = cleaner
-        self.xmlns, content = strip_namespace(content)
         self.unix_timestamp = unix_timestamp
+        self.entry_class = entry_class
+        self.stats = stats
+        self.limits = limits
+        self.clean_pool = clean_pool
+        self.clean_threshold = clean_threshold
+        self.entry_filter = entry_filter
+        self.entry_errors = []
+        if stats is not None:
+            stats.instrument(self, self.instrumented)
+        tree = self.parse_xml(content)
         if self.xmlns and '#' in self.xmlns:
             self.xmlns = self.xmlns.strip('#')
-        parser = etree.XMLParser(recover=True)
-        tree = etree.fromstring(content, parser=parser)
         if isinstance(tree, etree._ElementTree):
             self.tree = tree
             self.root = tree.getroot()
@@ -585,38 +1467,63 @@ class SpeedParser(object):
             self.tree = tree.getroottree()
             self.root = tree
         self.encoding = encoding if encoding else self.parse_encoding()
-        self.version = self.parse_version()
-        if self.version in self.version_map:
-            self.version = self.version_map[self.version]
-        if 'unk' in self.version:
-            raise IncompatibleFeedError("Could not determine version of this feed.")
-        self.namespaces = self.parse_namespaces()
+        if limits is not None:
+            limits.truncate_tree(self.root)
+        fingerprint = self.fingerprint() if profile is not None and not version else None
+        if fingerprint is not None and fingerprint == profile.fingerprint:
+            profile.hits += 1
+            self.version = profile.version
+            self.namespaces = profile.namespaces.copy()
+            self.nslookup = profile.nslookup
+            self.classes = profile.classes
+        else:
+            self.version = version or self.parse_version()
+            if self.version in self.version_map:
+                self.version = self.version_map[self.version]
+            if 'unk' in self.version:
+                raise IncompatibleFeedError("Could not determine version of this feed.")
+            self.namespaces = self.parse_namespaces()
+            self.nslookup = reverse_namespace_map(self.namespaces)
+            self.classes = self.parser_classes(self.version)
+            if fingerprint is not None:
+                profile.misses += 1
+                profile.store(self, fingerprint)
         self.feed = self.parse_feed(self.version, self.encoding)
         self.entries = self.parse_entries(self.version, self.encoding)
 
+    def parse_xml(self, content):
+        """Parse content with lxml, setting self.xmlns to the default namespace
+        that was stripped from it."""
+        parser = etree.XMLParser(recover=True)
+        if isinstance(content, basestring):
+            self.xmlns, content = self.strip_namespace(content)
+            return etree.fromstring(content, parser=parser)
+        stream = NamespaceStripper(content)
+        for chunk in stream:
+            parser.feed(chunk)
+        tree = parser.close()
+        self.xmlns = stream.xmlns
+        if tree is None:
+            raise IncompatibleFeedError("Document is empty or could not be parsed.")
+        return tree
+
+    def fingerprint(self):
+        """What SourceProfile checks a document against."""
+        root = self.root
+        nsmap = sorted((prefix or '', uri) for prefix, uri in root.nsmap.items())
+        return (root.tag, root.get('version'), self.xmlns, tuple(nsmap),
+            self.tree.docinfo.encoding)
+
+    def parser_classes(self, version):
+        """Return the feed and entries parser classes for a version."""
+        try:
+            return self.dispatch[version]
+        except KeyError:
+            raise IncompatibleFeedError("Feed not compatible with speedparser.")
+
     def parse_version(self):
-        r = self.root
-        root_ns, root_tag = clean_ns(r.tag)
-        root_tag = root_tag.lower()
-        vers = 'unk'
-        if self.xmlns and self.xmlns.lower() in xmlns_map:
-            value = xmlns_map[self.xmlns.lower()]
-            if value == 'rss10' and root_tag == 'rss':
-                value = 'rss010'
-            if not (value.startswith('atom') and root_tag == 'rss'):
-                return value
-        elif self.xmlns:
-            vers = self.xmlns.split('/')[-2].replace('.', '')
-        tag = root_tag
-        if r.attrib.get('version', None):
-            vers = r.attrib['version'].replace('.', '')
-        if root_tag in ('rss', 'rdf'):
-            tag = 'rss'
-        if root_tag in ('feed'):
-            tag = 'atom'
-        if root_tag == 'rss' and vers == '10' and root_tag == 'rss':
-            vers = ''
-        return '%s%s' % (tag, vers)
+        root_ns, root_tag = clean_ns(self.root.tag)
+        return feed_version(root_tag, self.xmlns, self.root.attrib.get('version', None))
 
     def parse_namespaces(self):
         nsmap = self.root.nsmap.copy()
@@ -634,26 +1541,21 @@ class SpeedParser(object):
         kwargs = dict(
             encoding=encoding,
             unix_timestamp=self.unix_timestamp,
-            namespaces=self.namespaces
+            namespaces=self.namespaces,
+            nslookup=self.nslookup,
+            stats=self.stats
         )
-        if version in ('rss20', 'rss092', 'rss091', 'rss'):
-            return SpeedParserFeedRss20(self.root, **kwargs).feed_dict()
-        if version in ('rss090', 'rss10'):
-            return SpeedParserFeedRdf(self.root, **kwargs).feed_dict()
-        if version in ('atom10', 'atom03'):
-            return SpeedParserFeedAtom(self.root, **kwargs).feed_dict()
-        raise IncompatibleFeedError("Feed not compatible with speedparser.")
+        return self.classes[0](self.root, **kwargs).feed_dict()
 
     def parse_entries(self, version, encoding):
-        kwargs = dict(encoding=encoding, namespaces=self.namespaces,
-            cleaner=self.cleaner, feed=self.feed, unix_timestamp=self.unix_timestamp)
-        if version in ('rss20', 'rss092', 'rss091', 'rss'):
-            return SpeedParserEntriesRss20(self.root, **kwargs).entry_list()
-        if version in ('rss090', 'rss10'):
-            return SpeedParserEntriesRdf(self.root, **kwargs).entry_list()
-        if version in ('atom10', 'atom03'):
-            return SpeedParserEntriesAtom(self.root, **kwargs).entry_list()
-        raise IncompatibleFeedError("Feed not compatible with speedparser.")
+        kwargs = dict(encoding=encoding, namespaces=self.namespaces, nslookup=self.nslookup,
+            cleaner=self.cleaner, feed=self.feed, unix_timestamp=self.unix_timestamp,
+            entry_class=self.entry_class, stats=self.stats, limits=self.limits,
+            clean_pool=self.clean_pool, clean_threshold=self.clean_threshold,
+            entry_filter=self.entry_filter)
+        parser = self.classes[1](self.root, **kwargs)
+        self.entry_errors = parser.errors
+        return parser.entry_list()
 
     def update(self, result):
         if self.version:
@@ -664,40 +1566,229 @@ class SpeedParser(object):
             result.feed.update(self.feed)
         if self.entries:
             result['entries'] = self.entries
+        if self.entry_errors:
+            result['entry_errors'] = self.entry_errors
+        if self.limits is not None and self.limits.exceeded:
+            result['limits_exceeded'] = self.limits.exceeded
         if self.encoding:
             result['encoding'] = self.encoding
 
 
-def parse(document, clean_html=True, unix_timestamp=False, encoding=None):
+class SpeedParserHeader(SpeedParser):
+    """Parses only the feed metadata.  The document is fed to lxml in small
+    chunks and parsing stops at the first item or entry (or at the end of
+    the channel, for rdf feeds, whose items follow it), which is dropped
+    along with anything after it;  no entries are parsed."""
+
+    def parse_xml(self, content):
+        parser = etree.XMLPullParser(events=('start', 'end'), recover=True)
+        stream = NamespaceStripper(content)
+        root = stop = None
+        for chunk in stream:
+            parser.feed(chunk)
+            for event, node in parser.read_events():
+                if root is None:
+                    root = node
+                tag = clean_ns(node.tag)[1].lower()
+                if (event == 'start' and tag in ('item', 'entry')) or \
+                        (event == 'end' and tag == 'channel'):
+                    stop = node
+                    break
+            if stop is not None:
+                break
+        self.xmlns = stream.xmlns
+        if stop is None:
+            root = parser.close()
+        # the parser is done with the tree before any of it is removed
+        parser = node = None
+        if root is None:
+            raise IncompatibleFeedError("Document is empty or could not be parsed.")
+        if stop is not None:
+            parent = stop.getparent()
+            for sibling in list(stop.itersiblings()):
+                parent.remove(sibling)
+            if event == 'start':
+                parent.remove(stop)
+        return root
+
+    def parse_encoding(self):
+        # lxml only reports the default encoding once a document is closed
+        return (self.tree.docinfo.encoding or 'utf-8').lower()
+
+    def parse_entries(self, version, encoding):
+        return []
+
+
+def entry_class_for(result_type):
+    """Return the class used to build entries for a parse result_type."""
+    if result_type == 'feedparser':
+        return feedparser.FeedParserDict
+    if result_type == 'compact':
+        return CompactEntry
+    raise ValueError("Unknown result_type %r;  use 'feedparser' or 'compact'." % result_type)
+
+
+def parse(document, clean_html=True, unix_timestamp=False, encoding=None,
+        result_type='feedparser', stats=None, version=None, max_entries=None,
+        max_field_bytes=None, max_depth=None, time_budget=None, profile=None,
+        clean_pool=None, clean_threshold=500, entry_filter=None):
     """Parse a document and return a feedparser dictionary with attr key access.
     If clean_html is False, the html in the feed will not be cleaned.  If
     clean_html is True, a sane version of lxml.html.clean.Cleaner will be used.
     If it is a Cleaner object, that cleaner will be used.  If unix_timestamp is
     True, the date information will be a numerical unix timestamp rather than a
     struct_time.  If encoding is provided, the encoding of the document will be
-    manually set to that."""
+    manually set to that.  Documents compressed with gzip, zlib or bz2 are
+    detected by their magic bytes and decompressed into the parser in chunks;
+    the document may also be an iterable of (possibly compressed) chunks.
+    If result_type is 'compact', entries are CompactEntry objects instead of
+    FeedParserDicts;  they are smaller and faster to access, and can be
+    converted with their to_feedparser method.  If stats is a ParseStats, the
+    time spent in each phase of the parse is recorded in it.  If version is
+    given (usually by classify), the feed version is not detected again;  an
+    'unsupported' version fails without parsing the document.  An exception
+    raised while parsing an entry does not make the feed bozo:  the field (or
+    the whole entry) it happened in is left out and the error is described in
+    result.entry_errors, which is only present if there were any.
+
+    max_entries, max_field_bytes, max_depth and time_budget limit the work
+    done on hostile or broken feeds (see ParseLimits):  only the first
+    max_entries entries are parsed, text and attribute values (and the html
+    of a field, before it is cleaned) are truncated to max_field_bytes bytes
+    of utf-8, entries nested more
+    than max_depth elements deep are skipped, and entries are no longer
+    parsed once time_budget seconds have passed.  If any limit was hit,
+    result.limits_exceeded counts what it cut, keyed by the limit's name.
+
+    If profile is a SourceProfile, the version, namespaces and parser classes
+    found for the previous document it was used with are reused when this
+    document's root looks the same;  use one profile per source.
+
+    If clean_pool is given (a multiprocessing or thread pool, or anything
+    else with a map method), the html of a feed with more than
+    clean_threshold entries is cleaned on it:  its entries are parsed first,
+    and then their distinct texts are cleaned in chunks on the pool and put
+    back in order.  A process pool needs the cleaner to be picklable, which
+    the default cleaners are.
+
+    entry_filter is a hook for choosing which entries to parse (see
+    speedparser.delta).  Its accept(index, node) method is called with the
+    element of each entry before it is parsed, and the entry is skipped if it
+    returns False;  parsed(index, entry) is then called with each entry that
+    was parsed."""
+    t0 = clock() if stats is not None else None
+    limits = None
+    if max_entries is not None or max_field_bytes is not None or max_depth is not None \
+            or time_budget is not None:
+        limits = ParseLimits(max_entries, max_field_bytes, max_depth, time_budget)
+    entry_class = entry_class_for(result_type)
     if isinstance(clean_html, bool):
         cleaner = default_cleaner if clean_html else fake_cleaner
     else:
         cleaner = clean_html
+    content = document
+    if not isinstance(document, basestring):
+        content = iter_decompressed(document)
+    elif compression_type(document[:4]):
+        content = iter_decompressed(iter_chunks(document))
+    result = empty_result()
+    try:
+        parser = SpeedParser(content, cleaner, unix_timestamp, encoding, entry_class, stats,
+            version, limits, profile, clean_pool, clean_threshold, entry_filter)
+        parser.update(result)
+    except Exception as e:
+        # encoding detection needs the whole document at once
+        if isinstance(e, UnicodeDecodeError) and encoding is True and \
+                isinstance(document, basestring):
+            if content is not document:
+                document = b''.join(iter_decompressed(iter_chunks(document)))
+            import chardet
+            encoding = chardet.detect(document)['encoding']
+            document = document.decode(encoding, 'replace').encode('utf-8')
+            return parse(document, clean_html, unix_timestamp, encoding, result_type, stats,
+                version, max_entries, max_field_bytes, max_depth, time_budget, profile,
+                clean_pool, clean_threshold, entry_filter)
+        set_bozo(result, e, stats)
+    if stats is not None:
+        stats.add('parse', clock() - t0)
+    return result
+
+
+def empty_result():
     result = feedparser.FeedParserDict()
     result['feed'] = feedparser.FeedParserDict()
     result['entries'] = []
     result['bozo'] = 0
+    return result
+
+
+def set_bozo(result, e, stats=None):
+    """Record the exception being handled in a result."""
+    import traceback
+    result['bozo'] = 1
+    result['bozo_exception'] = e
+    result['bozo_tb'] = traceback.format_exc()
+    if stats is not None:
+        stats.count('bozo')
+
+header_chunk_size = 4096
+
+
+def parse_feed_header(document, unix_timestamp=False, encoding=None, stats=None):
+    """Parse only the feed metadata (result.feed, version, namespaces and
+    encoding) of a document, without parsing its entries.  The document is
+    parsed incrementally and parsing stops at the first item or entry, so
+    only the head of a large feed is read.  Metadata that appears after the
+    first entry is not seen.  The document may be compressed or an iterable
+    of chunks, as with parse;  result.entries is always empty."""
+    t0 = clock() if stats is not None else None
+    if isinstance(document, basestring):
+        document = iter_chunks(document, header_chunk_size)
+    result = empty_result()
     try:
-        parser = SpeedParser(document, cleaner, unix_timestamp, encoding)
+        parser = SpeedParserHeader(iter_decompressed(document), fake_cleaner,
+            unix_timestamp, encoding, stats=stats)
         parser.update(result)
     except Exception as e:
-        if isinstance(e, UnicodeDecodeError) and encoding is True:
-            encoding = chardet.detect(document)['encoding']
-            document = document.decode(encoding, 'replace').encode('utf-8')
-            return parse(document, clean_html, unix_timestamp, encoding)
-        import traceback
-        result['bozo'] = 1
-        result['bozo_exception'] = e
-        result['bozo_tb'] = traceback.format_exc()
+        set_bozo(result, e, stats)
+    if stats is not None:
+        stats.add('parse', clock() - t0)
     return result
 
+
+def parse_file(f, **kwargs):
+    """Parse a feed from a filename or a file-like object.  The file is read
+    and handed to the parser in chunks, decompressing it on the way if it is
+    compressed, so a compressed feed is never held in memory twice.  Keyword
+    arguments are the same as for parse."""
+    if isinstance(f, basestring):
+        with open(f, 'rb') as fo:
+            return parse_file(fo, **kwargs)
+    chunks = iter(lambda: f.read(chunk_size), b'')
+    if kwargs.get('encoding', None) is True:
+        # encoding detection may need to see the whole document
+        return parse(b''.join(chunks), **kwargs)
+    return parse(chunks, **kwargs)
+
+
+def parse_many(documents, output='results', **kwargs):
+    """Parse an iterable of documents.  With output='results', returns a list
+    of parse results.  With output='columns', returns a ColumnBatch holding
+    the entries of every feed in per-field columns (title, link, guid, an
+    int64 epoch updated_parsed and content) with feed offsets;  no
+    FeedParserDict is built for any entry.  Other keyword arguments are
+    passed to parse."""
+    if output == 'results':
+        return [parse(document, **kwargs) for document in documents]
+    if output != 'columns':
+        raise ValueError("Unknown output %r;  use 'results' or 'columns'." % output)
+    from .columnar import ColumnBatch
+    kwargs.setdefault('result_type', 'compact')
+    batch = ColumnBatch()
+    for document in documents:
+        batch.append_result(parse(document, **kwargs))
+    return batch
+
 if __name__ == '__main__':
     import sys
 
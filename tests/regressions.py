@@ -75,6 +75,556 @@ class RdfRss090Support(TestCase):
         self.assertTrue(parse(feed).bozo == 0)
         self.assertTrue(len(parse(feed).entries) == 1)
 
+class CompressedInput(TestCase):
+    feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" xmlns="http://backend.userland.com/rss2" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel><title>Compressed</title><link>http://example.com/</link><description>A compressed feed</description><item><title>One</title><link>http://example.com/1</link><dc:creator>someone</dc:creator><description>first</description></item><item><title>Two</title><link>http://example.com/2</link><description>second</description></item></channel></rss>"""
+
+    def compressed(self):
+        import gzip, bz2, zlib
+        from io import BytesIO
+        buf = BytesIO()
+        f = gzip.GzipFile(fileobj=buf, mode='wb')
+        f.write(self.feed)
+        f.close()
+        return [buf.getvalue(), bz2.compress(self.feed), zlib.compress(self.feed)]
+
+    def test_compressed_documents(self):
+        plain = parse(self.feed)
+        self.assertEqual(plain.bozo, 0)
+        for doc in self.compressed():
+            result = parse(doc)
+            self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+            self.assertEqual(result.feed.title, plain.feed.title)
+            self.assertEqual([e.title for e in result.entries], ['One', 'Two'])
+            self.assertEqual(result.entries[0].author, plain.entries[0].author)
+
+    def test_parse_file_chunks(self):
+        """Small chunks make namespace declarations straddle chunk boundaries."""
+        from io import BytesIO
+        from speedparser import parse_file, speedparser
+        for doc in [self.feed] + self.compressed():
+            result = parse(speedparser.iter_chunks(doc, 7))
+            self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+            self.assertEqual(len(result.entries), 2)
+            result = parse_file(BytesIO(doc))
+            self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+            self.assertEqual(result.version, 'rss20')
+            self.assertEqual(len(result.entries), 2)
+
+    def test_decompression_bomb(self):
+        """A single chunk of deflate data used to be decompressed whole."""
+        import zlib
+        from speedparser import speedparser
+        bomb = zlib.compress(b' ' * (64 * 1024 * 1024), 9)
+        self.assertTrue(len(bomb) < speedparser.chunk_size)
+        total = 0
+        for data in speedparser.iter_decompressed([bomb]):
+            self.assertTrue(len(data) <= speedparser.chunk_size)
+            total += len(data)
+        self.assertEqual(total, 64 * 1024 * 1024)
+        for doc in self.compressed():
+            decompressed = speedparser.iter_decompressed(speedparser.iter_chunks(doc, 7))
+            self.assertEqual(b''.join(decompressed), self.feed)
+
+    def test_long_text(self):
+        """A text node with no '<' in it used to be held back and copied
+        until the next tag turned up."""
+        from speedparser import parse_feed_header, speedparser
+        doc = self.feed.replace('A compressed feed', 'x' * (4 * 1024 * 1024))
+        stripper = speedparser.NamespaceStripper(speedparser.iter_chunks(doc, 4096))
+        pieces = list(stripper)
+        self.assertTrue(max(len(piece) for piece in pieces) <= 4096 * 2)
+        self.assertEqual((stripper.xmlns, b''.join(pieces)), speedparser.strip_namespace(doc))
+        header = parse_feed_header(doc)
+        self.assertEqual(header.bozo, 0, header.get('bozo_exception'))
+        self.assertEqual(len(header.feed.subtitle), 4 * 1024 * 1024)
+
+class CompactResultType(TestCase):
+    def test_compact_entries(self):
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Compact</title><link>http://example.com/</link><item><title>One</title><guid>http://example.com/1</guid><pubDate>Thu, 19 Jan 2012 14:00:00 UTC</pubDate><description>first</description><enclosure url="http://example.com/1.mp3" length="10" type="audio/mpeg"/></item></channel></rss>"""
+        from speedparser.speedparser import CompactEntry
+        full = parse(feed)
+        compact = parse(feed, result_type='compact')
+        self.assertEqual(compact.bozo, 0)
+        entry = compact.entries[0]
+        self.assertTrue(isinstance(entry, CompactEntry))
+        self.assertEqual(entry.guid, entry.id)
+        self.assertEqual(entry.date, full.entries[0].updated)
+        self.assertTrue('comments' not in entry)
+        self.assertRaises(AttributeError, getattr, entry, 'comments')
+        self.assertEqual(entry.enclosures, full.entries[0].enclosures)
+        self.assertEqual(entry.to_feedparser(), full.entries[0])
+        self.assertRaises(ValueError, parse, feed, result_type='bogus')
+
+class FeedParserDictCompat(TestCase):
+    def test_feedparserdict_semantics(self):
+        """The precomputed key resolution in feedparsercompat must behave
+        like feedparser's FeedParserDict."""
+        from speedparser.feedparsercompat import FeedParserDict
+        d = FeedParserDict()
+        d['guid'] = 'id-1'
+        d['description'] = 'a summary'
+        self.assertEqual(dict(d), {'id': 'id-1', 'summary': 'a summary'})
+        self.assertEqual(d['guid'], 'id-1')
+        self.assertEqual(d.description, 'a summary')
+        self.assertTrue('guid' in d and 'id' in d and 'description' in d)
+        self.assertFalse('date' in d or 'comments' in d)
+        self.assertEqual(d.get('date', 'none'), 'none')
+        self.assertRaises(KeyError, lambda: d['date'])
+        self.assertRaises(AttributeError, getattr, d, 'date')
+        self.assertEqual(d.setdefault('guid', 'other'), 'id-1')
+        self.assertEqual(d.setdefault('date', 'today'), 'today')
+        self.assertEqual(d['updated'], 'today')
+        # only the real key is there, so a list alias falls through to it
+        d = FeedParserDict(subtitle='sub')
+        self.assertEqual(d['description'], 'sub')
+        d['description'] = 'sum'
+        self.assertEqual(d['description'], 'sum')
+        # computed keys
+        self.assertFalse('category' in d or 'enclosures' in d or 'license' in d)
+        d['tags'] = [{'term': 'python'}]
+        d['links'] = [{'rel': u'enclosure', 'href': 'a.mp3'},
+                      {'rel': u'license', 'href': 'http://cc/'}]
+        self.assertEqual(d.category, 'python')
+        self.assertEqual(d.enclosures, [{'href': 'a.mp3'}])
+        self.assertEqual(d.license, 'http://cc/')
+        d['tags'] = []
+        self.assertFalse('category' in d)
+        self.assertRaises(KeyError, lambda: d['category'])
+
+class ParseManyColumns(TestCase):
+    def test_parse_many_columns(self):
+        import calendar
+        from speedparser import parse_many
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Columns</title><link>http://example.com/</link><item><title>One</title><link>http://example.com/1</link><guid>g1</guid><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate><description>first</description></item><item><title>Two</title><link>http://example.com/2</link></item></channel></rss>"""
+        batch = parse_many([feed, '<not a feed>', feed], output='columns', clean_html=False)
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(list(batch.feed_offsets), [0, 2, 2, 4])
+        self.assertEqual(list(batch.bozo), [0, 1, 0])
+        self.assertEqual(batch.title.to_pylist(), ['One', 'Two', 'One', 'Two'])
+        self.assertEqual(batch.guid.to_pylist(), ['g1', None, 'g1', None])
+        self.assertEqual(batch.guid.null_count, 2)
+        self.assertEqual(batch.updated_parsed[0], calendar.timegm((2012, 1, 19, 14, 0, 0)))
+        self.assertEqual(batch.updated_parsed[1], None)
+        self.assertEqual(batch.updated_parsed[-4], batch.updated_parsed[0])
+        for column in (batch.updated_parsed, batch.title):
+            self.assertRaises(IndexError, column.__getitem__, 4)
+            self.assertRaises(IndexError, column.__getitem__, -5)
+        self.assertEqual(batch.content[0], 'first')
+        self.assertEqual(list(batch.link.offsets), [0, 20, 40, 60, 80])
+        results = parse_many([feed], output='results')
+        self.assertEqual(results[0].entries[0].title, 'One')
+
+class SerializeRoundTrip(TestCase):
+    def test_serialize_round_trip(self):
+        from speedparser import serialize
+        from speedparser.speedparser import IncompatibleFeedError
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel><title>Serialize</title><link>http://example.com/</link><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate><item><title>One</title><link>http://example.com/1</link><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate><enclosure url="http://example.com/1.mp3" length="10" type="audio/mpeg"/><media:thumbnail url="http://example.com/1.jpg"/></item></channel></rss>"""
+        for result_type in ('feedparser', 'compact'):
+            result = parse(feed, result_type=result_type)
+            loaded = serialize.loads(serialize.dumps(result))
+            self.assertEqual(loaded, result)
+            self.assertEqual(type(loaded.entries[0]), type(result.entries[0]))
+            self.assertEqual(loaded.feed.updated_parsed, result.feed.updated_parsed)
+            self.assertEqual(loaded.entries[0].enclosures, result.entries[0].enclosures)
+            self.assertEqual(loaded.entries[0].media_thumbnail, result.entries[0].media_thumbnail)
+        bozo = serialize.loads(serialize.dumps(parse('<unknown/>')))
+        self.assertEqual(bozo.bozo, 1)
+        self.assertTrue(isinstance(bozo.bozo_exception, IncompatibleFeedError))
+        self.assertTrue('"updated_parsed":1326981600' in serialize.to_json(result))
+
+class ParseStatsInstrumentation(TestCase):
+    def test_parse_stats(self):
+        from speedparser import ParseStats
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Stats</title><link>http://example.com/</link><item><title>One</title><link>http://example.com/1</link><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate><description>first</description></item><item><title>Two</title><description>second</description></item></channel></rss>"""
+        stats = ParseStats()
+        self.assertEqual(parse(feed, stats=stats), parse(feed))
+        parse(feed, stats=stats)
+        parse('<unknown/>', stats=stats)
+        counts = dict((k, v['count']) for k, v in stats.as_dict().items())
+        self.assertEqual(counts['parse'], 3)
+        self.assertEqual(counts['bozo'], 1)
+        self.assertEqual(counts['parse_xml'], 3)
+        self.assertEqual(counts['parse_entries'], 2)
+        self.assertEqual(counts['parse_entry'], 4)
+        self.assertEqual(counts['entry.title'], 4)
+        self.assertEqual(counts['entry.date'], 2)
+        self.assertEqual(counts['date'], 2)
+        self.assertTrue(counts['clean'] >= 4)
+        self.assertTrue(stats.timings['parse'] > 0)
+
+class FallbackRouting(TestCase):
+    def test_fallback_routing(self):
+        from speedparser.fallback import FallbackRouter
+        good = """<?xml version="1.0"?><rss version="2.0"><channel><title>Good</title><item><title>One</title></item></channel></rss>"""
+        bad = """<?xml version="1.0"?><unknown><title>Bad</title></unknown>"""
+        calls = []
+        def fallback(document):
+            calls.append(document)
+            return {'bozo': 0, 'engine': 'fallback'}
+        router = FallbackRouter(max_sources=2, reprobe_every=3, fallback=fallback)
+        self.assertEqual(router.parse(good, source_key='a').feed.title, 'Good')
+        self.assertEqual(router.parse(bad, source_key='b')['engine'], 'fallback')
+        self.assertTrue(router.needs_fallback('b'))
+        # routed straight to the fallback, then re-probed on the third parse
+        router.parse(good, source_key='b')
+        router.parse(good, source_key='b')
+        self.assertEqual(router.counters['routed'], 2)
+        self.assertEqual(router.parse(good, source_key='b').feed.title, 'Good')
+        self.assertEqual(router.counters['recovered'], 1)
+        self.assertFalse(router.needs_fallback('b'))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(router.fallback_rate(), 3 / 5.0)
+        for key in 'cde':
+            router.parse(bad, source_key=key)
+        self.assertEqual(list(router.sources), ['d', 'e'])
+
+class ClassifyHead(TestCase):
+    def test_classify(self):
+        import zlib
+        from speedparser import classify
+        rss = """<?xml version="1.0"?><!-- <feed> --><!DOCTYPE rss [<!ENTITY nbsp "&#160;">]><rss version="2.0"><channel><title>Classify</title><item><title>One</title></item></channel></rss>"""
+        atom = """<feed xmlns="http://www.w3.org/2005/Atom"><title>Atom</title></feed>"""
+        rdf = """<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"><channel><title>Rdf</title></channel></rdf:RDF>"""
+        self.assertEqual(classify(rss), 'rss20')
+        self.assertEqual(classify(zlib.compress(rss)), 'rss20')
+        self.assertEqual(classify(atom), 'atom10')
+        self.assertEqual(classify(rdf), 'rss10')
+        for doc in ('<unknown/>', '<rss version="0.93"/>', 'garbage', ''):
+            self.assertEqual(classify(doc), 'unsupported')
+        # only the head of a document is read for its root
+        for doc in ('x' * (16 << 20), '<!-- %s -->' % ('x' * 100000) + rss):
+            self.assertEqual(classify(doc), 'unsupported')
+        self.assertEqual(classify('<!-- %s -->' % ('x' * 60000) + rss), 'rss20')
+        result = parse(rss, version=classify(rss))
+        self.assertEqual(result.version, 'rss20')
+        self.assertEqual(result.entries[0].title, 'One')
+        result = parse(atom, version='unsupported')
+        self.assertEqual(result.bozo, 1)
+
+class FeedHeaderOnly(TestCase):
+    def test_parse_feed_header(self):
+        from speedparser import parse_feed_header
+        from speedparser.speedparser import iter_chunks
+        rss = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Header</title><link>http://example.com/</link><language>en</language><generator>http://example.com/gen</generator><item><title>One</title></item><item><title>Two</title></item><ttl>60</ttl></channel></rss>"""
+        rdf = """<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"><channel><title>Rdf</title><link>http://example.com/</link></channel><item><title>One</title></item></rdf:RDF>"""
+        for doc in (rss, rdf):
+            full = parse(doc)
+            for source in (doc, iter_chunks(doc, 5)):
+                header = parse_feed_header(source)
+                self.assertEqual(header.bozo, 0, header.get('bozo_exception'))
+                self.assertEqual(header.feed, full.feed)
+                self.assertEqual(header.version, full.version)
+                self.assertEqual(header.entries, [])
+        self.assertEqual(parse_feed_header('<unknown/>').bozo, 1)
+
+class EntryFaultIsolation(TestCase):
+    def test_entry_errors(self):
+        """An exception in one field handler used to make the whole feed bozo."""
+        class FailingCleaner(object):
+            def clean_html(self, html):
+                if 'fail' in html:
+                    raise ValueError("cannot clean this")
+                return html
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Faults</title><item><title>One</title><link>http://example.com/1</link><description>fail</description></item><item><title>Two</title><link>http://example.com/2</link><description>second</description></item></channel></rss>"""
+        result = parse(feed, clean_html=FailingCleaner())
+        self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+        self.assertEqual([e.title for e in result.entries], ['One', 'Two'])
+        self.assertEqual(result.entries[0].link, 'http://example.com/1')
+        self.assertTrue('summary' not in result.entries[0])
+        self.assertEqual(result.entries[1].summary, 'second')
+        self.assertEqual(len(result.entry_errors), 1)
+        error = result.entry_errors[0]
+        self.assertEqual((error['entry'], error['field'], error['type']), (0, 'summary', 'ValueError'))
+        self.assertEqual(error['line'], 1)
+        self.assertTrue('entry_errors' not in parse(feed))
+
+    def test_non_element_children(self):
+        """A processing instruction in an item used to drop the whole entry,
+        and one in the channel made the feed bozo."""
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>PIs</title><?pi x?><item><title>One</title><?pi x?><!-- c --><link>http://example.com/1</link></item></channel></rss>"""
+        result = parse(feed)
+        self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+        self.assertEqual(result.feed.title, 'PIs')
+        self.assertEqual([(e.title, e.link) for e in result.entries], [('One', 'http://example.com/1')])
+        self.assertTrue('entry_errors' not in result)
+
+class NestedNamespaces(TestCase):
+    def test_nested_namespace_declarations(self):
+        """Namespaces declared below the root used to raise a KeyError in
+        parse_links, or have their elements ignored."""
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Nested</title><item xmlns:m="http://search.yahoo.com/mrss/"><title>One</title><link href="http://example.com/1"><x:extra xmlns:x="http://example.com/x">?</x:extra><plain/></link><m:thumbnail url="http://example.com/1.jpg"/></item><item><title>Two</title><itunes:summary xmlns:itunes="HTTP://www.itunes.com/DTDs/PodCast-1.0.dtd">podcast</itunes:summary></item></channel></rss>"""
+        result = parse(feed)
+        self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+        self.assertTrue('entry_errors' not in result)
+        self.assertEqual(result.entries[0].media_thumbnail, [{'url': 'http://example.com/1.jpg'}])
+        self.assertEqual(result.entries[1].summary, '<p>podcast</p>')
+        self.assertTrue('namespaces' not in result)
+
+class ResourceLimits(TestCase):
+    def test_limits(self):
+        item = """<item><title>%s</title><description>%s</description></item>"""
+        items = ''.join(item % ('Item %d' % i, 'x' * 100) for i in range(10))
+        deep = """<item><title>Deep</title><a><b><c><d>deep</d></c></b></a></item>"""
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Limits</title>%s%s</channel></rss>""" % (deep, items)
+        result = parse(feed, clean_html=False)
+        self.assertEqual(len(result.entries), 11)
+        self.assertTrue('limits_exceeded' not in result)
+        result = parse(feed, clean_html=False, max_entries=5, max_field_bytes=10, max_depth=3)
+        self.assertEqual(result.bozo, 0)
+        self.assertEqual([e.title for e in result.entries], ['Item %d' % i for i in range(4)])
+        self.assertEqual(result.entries[0].summary, 'x' * 10)
+        self.assertEqual(result.limits_exceeded,
+            {'max_entries': 6, 'max_depth': 1, 'max_field_bytes': 10})
+        self.assertEqual(len(parse(feed, max_depth=4).entries), 11)
+        result = parse(feed, time_budget=0)
+        self.assertEqual(result.entries, [])
+        self.assertEqual(result.limits_exceeded, {'time_budget': 11})
+
+    def test_field_bytes(self):
+        """max_field_bytes limits the fields that are not cleaned, and the
+        feed's own fields, and counts bytes rather than characters."""
+        feed = u"""<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>%s</title><item><title>Item</title><guid>http://example.com/%s</guid><author>%s</author><link>http://example.com/%s</link><enclosure url="http://example.com/%s.mp3" type="audio/mpeg"/></item></channel></rss>""" % (
+            u'\xe9' * 20, 'g' * 100, u'\u20ac' * 20, 'l' * 100, 'e' * 100)
+        result = parse(feed.encode('utf-8'), max_field_bytes=30)
+        self.assertEqual(result.bozo, 0, result.get('bozo_exception'))
+        self.assertEqual(result.feed.title, u'\xe9' * 15)
+        entry = result.entries[0]
+        self.assertEqual(entry.id, 'http://example.com/' + 'g' * 11)
+        self.assertEqual(entry.link, 'http://example.com/' + 'l' * 11)
+        self.assertEqual(entry.author, u'\u20ac' * 10)
+        self.assertEqual(entry.enclosures[0].url, 'http://example.com/' + 'e' * 11)
+        self.assertEqual(result.limits_exceeded, {'max_field_bytes': 5})
+
+class MungeAuthorLinear(TestCase):
+    def test_munge_author(self):
+        from speedparser.speedparser import munge_author
+        cases = [
+            (u'Jane Doe', u'Jane Doe'),
+            (u'jane@example.com (Jane Doe)', u'Jane Doe (jane@example.com)'),
+            (u'Jane Doe <jane.doe+feeds@mail.example.co.uk>', u'Jane Doe (jane.doe+feeds@mail.example.co.uk)'),
+            (u'jane@example.com', u' (jane@example.com)'),
+            (u'Jane Doe &lt;jane@example.com&gt;', u'Jane Doe (jane@example.com)'),
+            (u'mailto:jane@[192.168.0.1]', u'mailto: (jane@[192.168.0.1])'),
+            (u'jane@example.com?subject=Hello', u' (jane@example.com?subject=Hello)'),
+            (u'a@b@c.com', u'a@ (b@c.com)'),
+            (u'(x@y.org) <>', u' (x@y.org)'),
+        ]
+        for author, munged in cases:
+            self.assertEqual(munge_author(author), munged)
+        # these used to backtrack for minutes
+        garbage = (u'a' * 20000) + u'@' + (u'b' * 20000)
+        self.assertEqual(munge_author(garbage), garbage)
+        self.assertEqual(munge_author(u'@'.join([u'a.b-c'] * 5000)), u'@'.join([u'a.b-c'] * 5000))
+
+class UrlResolution(TestCase):
+    def test_url_resolver(self):
+        from speedparser.speedparser import UrlResolver, full_href, full_href_attribs
+        base = 'http://example.com/dir/page'
+        hrefs = ['http://other.com/a', 'https://other.com/', 'http://other.com/a?',
+            'http://other.com/a#', 'http://', 'HTTP://other.com/', 'rel/1', '/abs',
+            '../up', '', '?q=1', '//host/x', u'rel/1', 'mailto:x@example.com']
+        for b in (None, '', base):
+            urls = UrlResolver(b)
+            for href in hrefs * 2:
+                self.assertEqual(urls.resolve(href), full_href(href, b))
+                self.assertEqual(type(urls.resolve(href)), type(full_href(href, b)))
+            attribs = {'href': 'rel/2', 'rel': 'enclosure'}
+            self.assertEqual(urls.resolve_attribs(attribs), full_href_attribs(attribs, b))
+        feed = """<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom" xml:base="http://example.com/d/"><title>Base</title><entry><title>One</title><link href="rel/1"/><link rel="enclosure" href="http://example.com/a.mp3"/></entry></feed>"""
+        entry = parse(feed).entries[0]
+        self.assertEqual(entry.link, 'http://example.com/d/rel/1')
+        self.assertEqual(entry.links[1]['href'], 'http://example.com/a.mp3')
+
+class InnertextSingleSerialization(TestCase):
+    def test_innertext(self):
+        from lxml import etree
+        from speedparser.speedparser import innertext
+        root = etree.fromstring('<r xmlns:m="http://example.com/m"><c a="x&gt;y">caf\xc3\xa9 &amp; <b>bold</b> &lt;t&gt; <i a="1&gt;2">it</i> tail<m:x/>end<!-- c --></c>after</r>')
+        node = root[0]
+        self.assertEqual(innertext(node), u'caf\xe9 & <b>bold</b> &lt;t&gt; <i a="1&gt;2">it</i> tail<m:x/>end<!-- c -->after')
+        self.assertEqual(innertext(node[0]), 'bold')
+        # namespaces declared on the node itself are kept
+        node = etree.fromstring('<r><c xmlns:m="http://m"><m:x>1</m:x></c></r>')[0]
+        self.assertEqual(innertext(node), '<m:x xmlns:m="http://m">1</m:x>')
+        feed = """<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><title>X</title><entry><title>One</title><content type="xhtml"><p>one</p><p>two &amp; <b>three</b></p></content></entry></feed>"""
+        entry = parse(feed, clean_html=False).entries[0]
+        self.assertEqual(entry.content[0]['value'], '<p>one</p><p>two &amp; <b>three</b></p>')
+
+class LazyImports(TestCase):
+    def test_lazy_cleaner_and_provider(self):
+        import pickle
+        import speedparser
+        from speedparser import feedparsercompat
+        from speedparser.speedparser import default_cleaner
+        cleaner = pickle.loads(pickle.dumps(default_cleaner))
+        self.assertEqual(cleaner.clean_html('<p>x<script>y</script></p>'), '<p>x</p>')
+        self.assertTrue(cleaner.javascript)
+        feed = """<rss version="2.0"><channel><title>Lazy</title></channel></rss>"""
+        self.assertTrue(type(parse(feed)) is feedparsercompat.FeedParserDict)
+        try:
+            import feedparser
+        except ImportError:
+            return
+        try:
+            speedparser.use_feedparser()
+            self.assertTrue(type(parse(feed)) is feedparser.FeedParserDict)
+        finally:
+            speedparser.use_feedparser(False)
+        self.assertTrue(type(parse(feed)) is feedparsercompat.FeedParserDict)
+
+class SourceProfileCache(TestCase):
+    def test_source_profile(self):
+        from speedparser import SourceProfile
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel><title>Profile</title><item><title>%s</title><dc:creator>someone</dc:creator></item></channel></rss>"""
+        profile = SourceProfile()
+        first = parse(feed % 'One', profile=profile)
+        self.assertEqual((profile.hits, profile.misses), (0, 1))
+        self.assertEqual(profile.version, 'rss20')
+        second = parse(feed % 'Two', profile=profile)
+        self.assertEqual((profile.hits, profile.misses), (1, 1))
+        self.assertEqual(second, parse(feed % 'Two'))
+        self.assertEqual(second.entries[0].author, 'someone')
+        second.namespaces.clear()
+        self.assertEqual(parse(feed % 'Three', profile=profile).namespaces, first.namespaces)
+        # a changed root is detected again
+        atom = """<feed xmlns="http://www.w3.org/2005/Atom"><title>Atom</title><entry><title>One</title></entry></feed>"""
+        self.assertEqual(parse(atom, profile=profile).version, 'atom10')
+        self.assertEqual((profile.hits, profile.misses), (2, 2))
+        self.assertEqual(parse('<unknown/>', profile=profile).bozo, 1)
+        self.assertEqual(profile.version, 'atom10')
+
+class ParallelCleaning(TestCase):
+    def test_clean_pool(self):
+        from multiprocessing.pool import ThreadPool
+        class CountingPool(object):
+            def __init__(self):
+                self.pool, self.chunks = ThreadPool(2), 0
+            def map(self, func, chunks):
+                self.chunks += len(chunks)
+                return self.pool.map(func, chunks)
+        item = """<item><title>&lt;p&gt;Item %d&lt;/p&gt;</title><link>http://example.com/%d</link><description>&lt;p&gt;body %d &lt;script&gt;x()&lt;/script&gt;&lt;/p&gt;</description><comments>&lt;p&gt;same&lt;/p&gt;</comments></item>"""
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Pool</title>%s</channel></rss>""" % ''.join(item % (i, i, i) for i in range(40))
+        pool = CountingPool()
+        try:
+            expected = parse(feed)
+            result = parse(feed, clean_pool=pool, clean_threshold=10)
+            self.assertEqual(result, expected)
+            self.assertEqual(result.entries[3].title, 'Item 3')
+            self.assertEqual(result.entries[3].content[0]['value'], '<p>body 3 </p>')
+            # the shared comments text is cleaned once:  81 distinct texts
+            self.assertEqual(pool.chunks, 6)
+            parse(feed, clean_pool=pool, clean_threshold=40)
+            self.assertEqual(pool.chunks, 6)
+            class FailingCleaner(object):
+                def clean_html(self, html):
+                    if 'body 1 ' in html:
+                        raise ValueError("cannot clean this")
+                    return html
+            result = parse(feed, clean_html=FailingCleaner(), clean_pool=pool, clean_threshold=10)
+            self.assertEqual(result.entries[0].summary, parse(feed, clean_html=FailingCleaner()).entries[0].summary)
+            self.assertTrue('summary' not in result.entries[1] and 'content' not in result.entries[1])
+            self.assertEqual([(e['entry'], e['field'], e['type']) for e in result.entry_errors],
+                [(1, 'summary', 'ValueError')])
+        finally:
+            pool.pool.terminate()
+
+class SharedMemoryTransport(TestCase):
+    def test_shared_result(self):
+        import os, pickle
+        from speedparser import sharedmem
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Shared</title><item><title>One</title><link>http://example.com/1</link><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate></item><item><title>Two</title><link>http://example.com/2</link></item></channel></rss>"""
+        handle = pickle.loads(pickle.dumps(sharedmem.parse_to_shared(feed)))
+        self.assertEqual(handle.entries, 2)
+        self.assertTrue(os.path.exists(handle.path))
+        with sharedmem.open_result(handle) as shared:
+            self.assertFalse(os.path.exists(handle.path))
+            self.assertEqual(shared.feed.title, 'Shared')
+            self.assertEqual(len(shared.entries), 2)
+            self.assertEqual(shared.entries[-1].link, 'http://example.com/2')
+            self.assertEqual(sorted(shared.entries.cache), [1])
+            self.assertEqual(shared.load(), parse(feed))
+        self.assertEqual(shared.map, None)
+        handle = sharedmem.parse_to_shared(feed, result_type='compact')
+        sharedmem.discard(handle)
+        self.assertFalse(os.path.exists(handle.path))
+
+class SqliteCache(TestCase):
+    def test_sqlite_parse_cache(self):
+        import os, shutil, tempfile
+        from lxml.html.clean import Cleaner
+        from speedparser.cache import SqliteParseCache
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Cached %d</title><item><title>One</title><link>http://example.com/1</link><pubDate>Thu, 19 Jan 2012 14:00:00 GMT</pubDate></item></channel></rss>"""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'cache.db')
+            with SqliteParseCache(path, max_entries=3) as cache:
+                first = cache.parse(feed % 0)
+                self.assertEqual(first, parse(feed % 0))
+                self.assertEqual(cache.parse(feed % 0), first)
+                # a hit is only recorded in memory until the next eviction
+                self.assertEqual(len(cache.accessed), 1)
+                cache.parse(feed % 0, clean_html=False)
+                self.assertEqual((cache.counters['hits'], cache.counters['misses']), (1, 2))
+                cache.parse(feed % 0, clean_html=Cleaner())
+                self.assertEqual(cache.counters['uncacheable'], 1)
+                for i in range(1, 4):
+                    cache.parse(feed % i)
+                # evicted down to 90% of max_entries, least recently used first
+                self.assertEqual(cache.counters['evictions'], 2)
+                self.assertEqual(len(cache), 3)
+                self.assertEqual(cache.accessed, {})
+                # the counts kept by triggers follow replaced results
+                cache.put('replaced', parse(feed % 8))
+                cache.put('replaced', parse(feed % 9 + ' ' * 100))
+                self.assertEqual(cache.size(), cache.db.execute(
+                    'select count(*), sum(size) from results').fetchone())
+            # a new process sees what an earlier one stored
+            with SqliteParseCache(path, ttl=3600) as cache:
+                self.assertEqual(cache.parse(feed % 3).feed.title, 'Cached 3')
+                self.assertEqual(cache.hit_rate(), 1.0)
+                self.assertEqual(cache.db.execute('pragma journal_mode').fetchone()[0], 'wal')
+                cache.db.execute('update results set created = created - 7200')
+                cache.parse(feed % 3)
+                # the other expired result is removed when it is stored again
+                self.assertEqual((cache.counters['misses'], cache.counters['expired']), (1, 2))
+                self.assertEqual(len(cache), 1)
+        finally:
+            shutil.rmtree(directory)
+
+class DeltaParsing(TestCase):
+    def test_parse_delta(self):
+        from speedparser.delta import parse_delta
+        class CountingCleaner(object):
+            def __init__(self):
+                self.texts = []
+            def clean_html(self, html):
+                self.texts.append(html)
+                return html
+        item = """<item><title>%s</title><guid>%s</guid><description>body %s</description></item>"""
+        feed = """<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Delta</title>%s</channel></rss>"""
+        first = feed % ''.join(item % (i, i, i) for i in 'abc')
+        result, state = parse_delta(first)
+        self.assertEqual(result.entries, parse(first).entries)
+        self.assertEqual(len(result.added), 3)
+        self.assertEqual(sorted(state), ['a', 'b', 'c'])
+        cleaner = CountingCleaner()
+        second = feed % (item % ('b', 'b', 'b') + item % ('C', 'c', 'c') + item % ('d', 'd', 'd'))
+        result, state = parse_delta(second, state, clean_html=cleaner)
+        # b is unchanged and is not parsed at all
+        self.assertEqual([e.title for e in result.entries], ['C', 'd'])
+        self.assertEqual([e.guid for e in result.changed], ['c'])
+        self.assertEqual([e.guid for e in result.added], ['d'])
+        self.assertEqual(result.removed, ['a'])
+        self.assertEqual(sorted(state), ['b', 'c', 'd'])
+        self.assertEqual(sorted(cleaner.texts), ['C', 'body c', 'body d', 'd'])
+        result, unchanged = parse_delta(second, state)
+        self.assertEqual((result.entries, result.removed, unchanged), ([], [], state))
+        # entries cut by a limit are neither parsed nor removed
+        result, limited = parse_delta(first, state, max_entries=1)
+        self.assertEqual([e.title for e in result.entries], ['a'])
+        self.assertEqual(result.removed, [])
+        self.assertEqual(sorted(limited), ['a', 'b', 'c', 'd'])
+
 class XmlnsSpaceSupport(TestCase):
     def test_xmlns_space_support(self):
         from os import path
@@ -468,6 +468,25 @@ class SpeedTestNoClean(TestCaseBase):
         print("speedparser (no html cleaning): %0.2f/sec, %s/sec" % (pct(spspeed), sizeformat(fullsize/spspeed)))
         #print "feedparser: %0.2f/sec,  speedparser: %0.2f/sec (html cleaning disabled)" % (pct(fpspeed), pct(spspeed))
 
+class PerformanceRegressionTest(TestCase):
+    """Compare the speed of this checkout against a baseline recorded with
+    `python -m benchmarks.baseline record`;  set SPEEDPARSER_BASELINE to the
+    baseline's path to enable it."""
+    def setUp(self):
+        self.path = os.environ.get('SPEEDPARSER_BASELINE')
+        if not self.path:
+            self.skipTest("SPEEDPARSER_BASELINE is not set")
+
+    def test_no_regressions(self):
+        from benchmarks import baseline
+        base = baseline.load(self.path)
+        s = base['settings']
+        current = baseline.run(s['scenarios'], s['feeds'], s['repeat'], s['warmup'], s['seed'])
+        rows = baseline.compare(base, current)
+        baseline.report(rows)
+        regressions = [r for r in rows if r[-1] == 'regression']
+        self.assertFalse(regressions, "performance regressions: %s" % pformat(regressions))
+
 
 if __name__ == '__main__':
     build_feedparser_cache()